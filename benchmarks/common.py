@@ -0,0 +1,86 @@
+import os
+import time
+
+import joblib
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_PATH = os.path.join(BASE_DIR, 'predictor', 'trained_models')
+HEART_CSV = os.path.join(BASE_DIR, 'static', 'heart.csv')
+
+# heart.csv column -> HeartDiseaseForm field
+CSV_TO_FORM = {
+    'Age': 'age',
+    'Sex': 'gender',
+    'Gender': 'gender',
+    'ChestPainType': 'cp',
+    'RestingBP': 'trestbps',
+    'Cholesterol': 'chol',
+    'FastingBS': 'fbs',
+    'RestingECG': 'restecg',
+    'MaxHR': 'maxhr',
+    'ExerciseAngina': 'exang',
+    'Oldpeak': 'oldpeak',
+    'ST_Slope': 'slope',
+}
+
+
+def load_artifacts(version=None):
+    """The fitted sklearn steps of a model version's pipeline (the active one by default)."""
+    from predictor.model_registry import read_active_version, version_path
+    path = version_path(version or read_active_version(MODELS_PATH), MODELS_PATH)
+    pipeline = joblib.load(os.path.join(path, 'pipeline.pkl'))
+    steps = pipeline.named_steps
+    return {
+        'pipeline': pipeline,
+        'model': steps['model'],
+        'poly': steps['poly'],
+        'scaler': steps['scaler'],
+        'label_encoders': steps['encode'].label_encoders(),
+        'fill_values': steps['impute'].fill_values_,
+    }
+
+
+def load_records(n=None, seed=0):
+    """Rows of heart.csv shaped like HeartDiseaseForm.cleaned_data."""
+    df = pd.read_csv(HEART_CSV)
+    if n is not None:
+        df = df.sample(n=n, replace=n > len(df), random_state=seed)
+    records = []
+    for row in df.to_dict('records'):
+        data = {CSV_TO_FORM[col]: value for col, value in row.items() if col in CSV_TO_FORM}
+        data['age'] = int(data['age'])
+        data['trestbps'] = int(data['trestbps'])
+        data['chol'] = int(data['chol'])
+        data['maxhr'] = int(data['maxhr'])
+        data['oldpeak'] = float(data['oldpeak'])
+        data['fbs'] = str(int(data['fbs']))  # ChoiceField hands back strings
+        records.append(data)
+    return records
+
+
+def timed(func, items, repeat=1):
+    """Call func on every item and return (results, seconds per call)."""
+    results = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [func(item) for item in items]
+    elapsed = time.perf_counter() - start
+    return results, elapsed / (len(items) * repeat)
+
+
+def timed_once(func):
+    """Return (result, seconds) for a single call."""
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+UNITS = {'us/record': 1e6, 'ms': 1e3, 's': 1}
+
+
+def report(title, rows, unit='us/record'):
+    print(title)
+    width = max(len(name) for name, _ in rows)
+    for name, seconds in rows:
+        print(f"  {name:<{width}}  {seconds * UNITS[unit]:10.1f} {unit}")
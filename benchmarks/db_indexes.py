@@ -0,0 +1,104 @@
+"""Latency of the profile / patient_detail history queries with and without the
+(patient, -prediction_date, -id) and (patient, -created_at) indexes.
+
+Seeds a throw-away test database with ``n_predictions`` predictions spread
+over ``n_patients`` patients, times the queries with the indexes in place,
+drops them and times the same queries again. History pages are fetched the
+way the views do, in PREDICTION_ORDERING through keyset_queryset: the first
+page, and a deep page whose cursor sits halfway down the patient's history.
+
+    python -m benchmarks.db_indexes [n_predictions] [n_patients]
+"""
+import random
+import sys
+import textwrap
+import time
+
+from django.db import connection
+
+from predictor.models import Prediction, Recommendation
+from predictor.pagination import cursor_for, keyset_queryset
+from predictor.views import PREDICTION_ORDERING, PREDICTIONS_PAGE_SIZE
+
+from .common import report
+from .seed import seeded_database
+
+
+
+
+def history_page(patient_id, cursor=None):
+    return keyset_queryset(Prediction.objects.filter(patient_id=patient_id),
+                           PREDICTION_ORDERING, cursor, PREDICTIONS_PAGE_SIZE)
+
+
+QUERIES = {
+    'history first page': lambda pid, cursor: list(history_page(pid)),
+    'history deep page': lambda pid, cursor: list(history_page(pid, cursor)),
+    'latest prediction': lambda pid, cursor: (
+        Prediction.objects.filter(patient_id=pid).order_by(*PREDICTION_ORDERING).first()),
+    'recommendations': lambda pid, cursor: list(
+        Recommendation.objects.filter(patient_id=pid).order_by('-created_at')),
+}
+
+
+def middle_cursors(patient_ids):
+    """A cursor halfway down each patient's history, for the deep-page query."""
+    cursors = {}
+    for patient_id in patient_ids:
+        history = Prediction.objects.filter(patient_id=patient_id).order_by(*PREDICTION_ORDERING)
+        middle = history[history.count() // 2]
+        cursors[patient_id] = cursor_for(middle, PREDICTION_ORDERING)
+    return cursors
+
+
+def time_queries(cursors, repeat=3):
+    """Best-of-``repeat`` seconds per patient for every query in QUERIES."""
+    timings = {}
+    for name, query in QUERIES.items():
+        for patient_id, cursor in cursors.items():  # warm the page cache
+            query(patient_id, cursor)
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for patient_id, cursor in cursors.items():
+                query(patient_id, cursor)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best / len(cursors)
+    return timings
+
+
+def deep_page_plan(patient_id, cursor):
+    return history_page(patient_id, cursor).explain()
+
+
+def main(n_predictions=1_000_000, n_patients=2_000):
+    with seeded_database(n_predictions=n_predictions, n_patients=n_patients) as patient_ids:
+        sample = random.Random(0).sample(patient_ids, min(200, len(patient_ids)))
+        cursors = middle_cursors(sample)
+        with_indexes = time_queries(cursors)
+        plan_with = deep_page_plan(sample[0], cursors[sample[0]])
+
+        indexes = [(Prediction, index) for index in Prediction._meta.indexes] + \
+                  [(Recommendation, index) for index in Recommendation._meta.indexes]
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.remove_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        without_indexes = time_queries(cursors)
+        plan_without = deep_page_plan(sample[0], cursors[sample[0]])
+
+    print(f"{n_predictions} predictions over {n_patients} patients")
+    print("  deep history page plan without indexes:")
+    print(textwrap.indent(plan_without, '    '))
+    print("  deep history page plan with indexes:")
+    print(textwrap.indent(plan_with, '    '))
+    report("profile/patient_detail queries per patient (without -> with indexes)", [
+        (f'{name} {suffix}', timings[name])
+        for name in QUERIES
+        for suffix, timings in (('without', without_indexes), ('with', with_indexes))
+    ], unit='ms')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,49 @@
+"""RandomForestClassifier.predict vs the flattened FlatForest evaluator.
+
+    python -m benchmarks.forest [n_single_rows]
+"""
+import sys
+
+import numpy as np
+
+from predictor.forest import FlatForest
+from predictor.inference import FeatureCompiler, InferenceEngine
+
+from .common import load_artifacts, load_records, report, timed, timed_once
+
+
+def main(n=300):
+    artifacts = load_artifacts()
+    model = artifacts['model']
+    engine = InferenceEngine(model, artifacts['poly'], artifacts['scaler'],
+                             artifacts['label_encoders'],
+                             compiler=FeatureCompiler.from_transformers(artifacts['poly'],
+                                                                        artifacts['scaler']),
+                             fill_values=artifacts['fill_values'])
+    forest, export_t = timed_once(lambda: FlatForest.from_sklearn(model))
+
+    records = load_records()
+    X = np.vstack([engine.transform(engine.encode(data)).copy() for data in records])
+
+    batch_sklearn, sklearn_batch_t = timed_once(lambda: model.predict(X))
+    batch_flat, flat_batch_t = timed_once(lambda: forest.predict(X))
+    assert (batch_sklearn == batch_flat).all(), "batch predictions differ"
+    assert (model.predict_proba(X) == forest.predict_proba(X)).all(), "probabilities differ"
+
+    rows = [X[i:i + 1] for i in range(min(n, len(X)))]
+    single_sklearn, sklearn_t = timed(model.predict, rows)
+    single_flat, flat_t = timed(forest.predict, rows)
+    assert all((a == b).all() for a, b in zip(single_sklearn, single_flat)), "predictions differ"
+
+    print(f"{forest.n_trees} trees, {len(forest.feature)} nodes, max depth {forest.max_depth}, "
+          f"exported in {export_t * 1e3:.1f} ms")
+    report(f"{len(rows)} single rows / {len(X)}-row batch, identical predictions", [
+        ('sklearn single row', sklearn_t),
+        ('flat single row', flat_t),
+        ('sklearn batch', sklearn_batch_t / len(X)),
+        ('flat batch', flat_batch_t / len(X)),
+    ])
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,72 @@
+"""Single-row inference: the old DataFrame preprocessing (benchmarks.legacy)
+vs InferenceEngine, with and without the fused FeatureCompiler, plus batch
+feature building.
+
+    python -m benchmarks.inference [n_records]
+"""
+import sys
+import warnings
+
+import numpy as np
+
+from predictor.inference import FeatureCompiler, InferenceEngine
+
+from .common import load_artifacts, load_records, report, timed, timed_once
+from .legacy import legacy_encode
+
+
+def main(n=500):
+    artifacts = load_artifacts()
+    model, poly, scaler = artifacts['model'], artifacts['poly'], artifacts['scaler']
+    label_encoders, fill_values = artifacts['label_encoders'], artifacts['fill_values']
+    engine = InferenceEngine(model, poly, scaler, label_encoders, fill_values=fill_values)
+    compiler = FeatureCompiler.from_transformers(poly, scaler)
+    compiled = InferenceEngine(model, poly, scaler, label_encoders, compiler=compiler,
+                               fill_values=fill_values)
+    records = load_records(n)
+
+    def legacy_features(data):
+        return scaler.transform(poly.transform(legacy_encode(data, label_encoders, fill_values)))
+
+    def legacy_predict(data):
+        return int(model.predict(legacy_features(data))[0])
+
+    def engine_features(data):
+        return engine.transform(engine.encode(data)).copy()
+
+    def compiled_features(data):
+        return compiled.transform(compiled.encode(data)).copy()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        old_features, old_feat_t = timed(legacy_features, records)
+        new_features, new_feat_t = timed(engine_features, records)
+        fused_features, fused_feat_t = timed(compiled_features, records)
+        old_preds, old_t = timed(legacy_predict, records)
+        new_preds, new_t = timed(engine.predict, records)
+        fused_preds, fused_t = timed(compiled.predict, records)
+
+        X = np.vstack([engine.encode(data).copy() for data in records])
+        batch_old, batch_old_t = timed_once(lambda: scaler.transform(poly.transform(X)))
+        batch_new, batch_new_t = timed_once(lambda: compiler.transform(X, out=np.empty_like(batch_old)))
+
+    for name, features in (('engine', new_features), ('compiled', fused_features)):
+        mismatched = sum((a != b).any() for a, b in zip(old_features, features))
+        assert mismatched == 0, f"{mismatched} {name} feature vectors differ"
+    assert old_preds == new_preds == fused_preds, "predictions differ"
+    assert (batch_old == batch_new).all(), "batch features differ"
+
+    report(f"{len(records)} records, identical features and predictions", [
+        ('legacy preprocessing', old_feat_t),
+        ('engine preprocessing', new_feat_t),
+        ('compiled preprocessing', fused_feat_t),
+        ('legacy end-to-end', old_t),
+        ('engine end-to-end', new_t),
+        ('compiled end-to-end', fused_t),
+        ('batch poly + scaler', batch_old_t / len(records)),
+        ('batch compiled', batch_new_t / len(records)),
+    ])
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,68 @@
+"""Frozen copy of how the app scored a form submission before the
+InferenceEngine and the pipeline existed, for the "legacy" and "baseline"
+benchmark rows; serving and training go through predictor.pipeline.
+
+``legacy_encode`` builds a one-row DataFrame and runs it through the old
+utils.preprocessing (its is_training=False branch). The one change from the
+original is that unmeasured cholesterol is filled with the bundle's training
+median instead of the median of the single row, so the features can be
+checked against the engine's.
+
+``extract_baseline_pickles`` recovers the separate model/scaler/poly/
+label_encoders pickles predictor.views loaded at import time from the
+commit that added them.
+"""
+import os
+import subprocess
+
+import pandas as pd
+
+from predictor.inference import FEATURE_COLUMNS, FORM_FIELDS
+
+from .common import BASE_DIR
+
+BASELINE_DIR = 'predictor/trained_models'
+# Loaded in this order by predictor.views before model versions existed.
+BASELINE_PICKLES = ['best_rf_model.pkl', 'scaler.pkl', 'poly.pkl', 'label_encoders.pkl']
+
+
+CATEGORICAL_COLUMNS = ['Gender', 'ChestPainType', 'RestingECG', 'ExerciseAngina', 'ST_Slope']
+
+
+def preprocessing(df, label_encoders, cholesterol_fill):
+    if 'Cholesterol' in df.columns:
+        df['Cholesterol'] = df['Cholesterol'].replace(0, cholesterol_fill)
+
+    for col in CATEGORICAL_COLUMNS:
+        if col in label_encoders:
+            if col not in df.columns:
+                raise ValueError(f"Column '{col}' is missing from the DataFrame.")
+            df[col] = label_encoders[col].transform(df[col])
+
+    return df
+
+
+def legacy_encode(data, label_encoders, fill_values):
+    user_data = {col: data[FORM_FIELDS[col]] for col in FEATURE_COLUMNS}
+    df = pd.DataFrame([user_data])
+    return preprocessing(df, label_encoders, fill_values['Cholesterol'])
+
+
+def extract_baseline_pickles(dest):
+    """Write the baseline's pickles and model_accuracy.txt into ``dest`` from git
+    history. Returns ``dest``, or None outside a git checkout that has them."""
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=BASE_DIR, capture_output=True,
+                              check=True).stdout
+
+    try:
+        commit = git('log', '-1', '--format=%H', '--diff-filter=A', '--',
+                     f'{BASELINE_DIR}/{BASELINE_PICKLES[0]}').decode().strip()
+        if not commit:
+            return None
+        for name in BASELINE_PICKLES + ['model_accuracy.txt']:
+            with open(os.path.join(dest, name), 'wb') as f:
+                f.write(git('show', f'{commit}:{BASELINE_DIR}/{name}'))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return dest
@@ -0,0 +1,100 @@
+"""Throughput and latency of heart() under WSGI vs heart_async() under ASGI.
+
+Runs ``n_requests`` form submissions from ``concurrency`` simulated clients
+against a throw-away file-backed test database. The WSGI path uses one
+thread per client with the sync test Client (as a threaded WSGI server
+would); the ASGI path runs every client on one event loop with AsyncClient.
+Requests turned away with 503 by the inference pool are counted separately.
+
+    python -m benchmarks.load_test [n_requests] [concurrency]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment
+
+from .common import load_records
+from .seed import create_people
+
+
+def summary(latencies, statuses, elapsed):
+    ok = [t for t, status in zip(latencies, statuses) if status == 302]
+    if not ok:
+        raise RuntimeError(f"No request succeeded, got status codes {sorted(set(statuses))}.")
+    cuts = statistics.quantiles(ok, n=100, method='inclusive')
+    return {
+        'ok': len(ok),
+        'rejected': statuses.count(503),
+        'throughput': len(ok) / elapsed,
+        'p50': cuts[49],
+        'p99': cuts[98],
+    }
+
+
+def run_wsgi(users, records, concurrency):
+    def client_loop(i):
+        client = Client()
+        client.force_login(users[i])
+        results = []
+        for data in records[i::concurrency]:
+            start = time.perf_counter()
+            response = client.post('/heart/', data)
+            results.append((time.perf_counter() - start, response.status_code))
+        connections.close_all()
+        return results
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = [r for client in pool.map(client_loop, range(concurrency)) for r in client]
+    elapsed = time.perf_counter() - start
+    return summary([t for t, _ in results], [s for _, s in results], elapsed)
+
+
+async def run_asgi(users, records, concurrency):
+    async def client_loop(i):
+        client = AsyncClient()
+        await client.aforce_login(users[i])
+        results = []
+        for data in records[i::concurrency]:
+            start = time.perf_counter()
+            response = await client.post('/heart/async/', data)
+            results.append((time.perf_counter() - start, response.status_code))
+        return results
+
+    start = time.perf_counter()
+    clients = await asyncio.gather(*(client_loop(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    results = [r for client in clients for r in client]
+    return summary([t for t, _ in results], [s for _, s in results], elapsed)
+
+
+def main(n_requests=2_000, concurrency=16):
+    setup_test_environment()  # allows the test client's 'testserver' host
+    records = load_records(n_requests)
+    with tempfile.TemporaryDirectory() as tmp:
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'load_test.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+        try:
+            _, patients = create_people(concurrency)
+            users = [patient.user for patient in patients]
+            wsgi = run_wsgi(users, records, concurrency)
+            asgi = asyncio.run(run_asgi(users, records, concurrency))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    print(f"{n_requests} heart form submissions from {concurrency} concurrent clients")
+    print(f"  {'':6}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'ok':>8}{'503':>8}")
+    for name, result in (('WSGI', wsgi), ('ASGI', asgi)):
+        print(f"  {name:6}{result['throughput']:10.1f}{result['p50'] * 1e3:10.1f}"
+              f"{result['p99'] * 1e3:10.1f}{result['ok']:8}{result['rejected']:8}")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
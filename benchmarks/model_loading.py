@@ -0,0 +1,124 @@
+"""Cold-start time and memory of the ways predictor.views has loaded the model:
+
+  baseline  eager joblib.load of the original best_rf_model/scaler/poly/
+            label_encoders pickles and DataFrame preprocessing, as the app
+            did before model versions existed (the pickles come from git
+            history, see benchmarks.legacy; skipped without it)
+  eager     eager joblib.load of the active version's pipeline.pkl
+  lazy      the lazy, memory-mapped ModelRegistry
+
+Each variant runs in a fresh interpreter. RssAnon is private to the worker;
+RssFile is file-backed page cache that every worker mapping the same
+artifacts shares.
+
+    python -m benchmarks.model_loading [n_runs]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from .common import BASE_DIR, report
+from .legacy import extract_baseline_pickles
+
+
+def read_memory():
+    memory = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'RssAnon', 'RssFile'):
+                memory[key] = int(value.split()[0])  # kB
+    return memory
+
+
+def child(variant, path=None):
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'heart3.settings')
+    django.setup()
+    from .common import load_records
+    # Imported up front so no variant is charged for them.
+    import pandas  # noqa: F401
+    import sklearn.ensemble  # noqa: F401
+    record = load_records(1)[0]
+    baseline = read_memory()
+
+    start = time.perf_counter()
+    if variant == 'baseline':
+        import joblib
+        from predictor.pipeline import LEGACY_FILL_VALUES
+        from .legacy import legacy_encode
+        model, scaler, poly, label_encoders = (
+            joblib.load(os.path.join(path, name)) for name in
+            ('best_rf_model.pkl', 'scaler.pkl', 'poly.pkl', 'label_encoders.pkl'))
+        with open(os.path.join(path, 'model_accuracy.txt'), 'r') as f:
+            float(f.read().strip())
+        import_time = time.perf_counter() - start
+
+        def predict(data):
+            X = legacy_encode(data, label_encoders, LEGACY_FILL_VALUES)
+            return int(model.predict(scaler.transform(poly.transform(X)))[0])
+    elif variant == 'eager':
+        from predictor.inference import InferenceEngine
+        from .common import load_artifacts
+        artifacts = load_artifacts()
+        import_time = time.perf_counter() - start
+        engine = InferenceEngine(artifacts['model'], artifacts['poly'],
+                                 artifacts['scaler'], artifacts['label_encoders'],
+                                 fill_values=artifacts['fill_values'])
+        predict = engine.predict
+    else:
+        import predictor.views  # noqa: F401
+        from predictor.model_registry import registry
+        import_time = time.perf_counter() - start
+        predict = registry.predict
+    predict(record)
+    first_prediction = time.perf_counter() - start
+
+    memory = read_memory()
+    print(json.dumps({
+        'import': import_time,
+        'first_prediction': first_prediction,
+        **{key: memory[key] - baseline[key] for key in memory},
+    }))
+
+
+def run(variant, path=None):
+    command = [sys.executable, '-m', 'benchmarks.model_loading', '--child', variant]
+    if path is not None:
+        command.append(path)
+    output = subprocess.run(command, cwd=BASE_DIR, capture_output=True, text=True,
+                            check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def variants(tmp):
+    """(variant, path) pairs to run; baseline only when its pickles can be recovered."""
+    path = extract_baseline_pickles(tmp)
+    if path is None:
+        print("baseline pickles not found in git history, skipping the baseline variant")
+        return [('eager', None), ('lazy', None)]
+    return [('baseline', path), ('eager', None), ('lazy', None)]
+
+
+def main(n=3):
+    with tempfile.TemporaryDirectory() as tmp:
+        for variant, path in variants(tmp):
+            runs = [run(variant, path) for _ in range(n)]
+            best = {key: min(r[key] for r in runs) for key in runs[0]}
+            report(f"{variant}: best of {n} cold starts", [
+                ('startup (import)', best['import']),
+                ('startup + first prediction', best['first_prediction']),
+            ], unit='ms')
+            print(f"  memory added: RSS {best['VmRSS'] / 1024:.1f} MiB, "
+                  f"private {best['RssAnon'] / 1024:.1f} MiB, "
+                  f"shared file-backed {best['RssFile'] / 1024:.1f} MiB")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(*sys.argv[2:4])
+    else:
+        main(*(int(arg) for arg in sys.argv[1:]))
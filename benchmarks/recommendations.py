@@ -0,0 +1,56 @@
+"""Recommendation suggestions for a whole cohort: one get_recommendations call
+per loaded Prediction vs the rules evaluated column-wise.
+
+Seeds a throw-away test database with ``n_predictions`` predictions and
+times both paths end to end (query included), then the rule evaluation
+alone on data already in memory.
+
+    python -m benchmarks.recommendations [n_predictions]
+"""
+import sys
+
+from predictor.models import Prediction
+from predictor.recommendations import (FIELDS, recommendations_for_columns,
+                                       recommendations_for_queryset)
+from predictor.utils import get_recommendations
+
+from .common import report, timed_once
+from .seed import seeded_database
+
+
+def per_instance(predictions):
+    return {p.id: get_recommendations(p) for p in predictions}
+
+
+def best_of(func, repeat=3):
+    result, best = None, float('inf')
+    for _ in range(repeat):
+        result, seconds = timed_once(func)
+        best = min(best, seconds)
+    return result, best
+
+
+def main(n_predictions=100_000):
+    with seeded_database(n_predictions=n_predictions, n_patients=1_000,
+                         recommendations_per_patient=0):
+        queryset = Prediction.objects.all()
+        loop, loop_time = best_of(lambda: per_instance(queryset.all()))
+        vectorized, vectorized_time = best_of(lambda: recommendations_for_queryset(queryset.all()))
+        assert loop == vectorized
+
+        instances = list(queryset.all())
+        rows = list(queryset.values_list(*FIELDS))
+        columns = dict(zip(FIELDS, zip(*rows)))
+        _, loop_only = best_of(lambda: [get_recommendations(p) for p in instances])
+        _, vectorized_only = best_of(lambda: recommendations_for_columns(columns))
+
+    report(f"Recommendations for {n_predictions} predictions", [
+        ('ORM objects + get_recommendations', loop_time),
+        ('values_list + vectorized rules', vectorized_time),
+        ('get_recommendations only (in memory)', loop_only),
+        ('vectorized rules only (in memory)', vectorized_only),
+    ], unit='ms')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
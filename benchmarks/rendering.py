@@ -0,0 +1,79 @@
+"""profile / patient_detail render time for a patient with ``n_predictions``
+predictions: rendering every history card vs the fragment cache cold
+(first view after a restart) and warm.
+
+Runs at the default page size and with the whole history on one page,
+which is how the pages rendered before they were paginated.
+
+    python -m benchmarks.rendering [n_predictions] [n_requests]
+"""
+import sys
+
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+
+import predictor.views
+from predictor import fragments
+from predictor.models import Prediction, Recommendation
+from predictor.utils import refresh_latest_predictions
+
+from .common import report, timed
+from .seed import PREDICTION_COLUMNS, _insert, create_people, prediction_rows, recommendation_rows
+
+
+def render_times(pages, n_requests):
+    """Seconds per request for each (name, client, url) with no cache, a cold and a warm cache."""
+    rows = []
+    for name, client, url in pages:
+        def get(_):
+            assert client.get(url).status_code == 200
+
+        with override_settings(PREDICTOR_FRAGMENT_CACHE_ALIAS=None):
+            get(None)  # compile the templates
+            _, uncached = timed(get, range(n_requests))
+
+        def cold(_):
+            fragments.fragment_cache().clear()
+            get(None)
+
+        _, cold_t = timed(cold, range(n_requests))
+        _, warm = timed(get, range(n_requests))
+        rows += [(f'{name} uncached', uncached), (f'{name} cold cache', cold_t),
+                 (f'{name} warm cache', warm)]
+    return rows
+
+
+def main(n_predictions=500, n_requests=50):
+    setup_test_environment()  # allows the test client's 'testserver' host
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        [doctor], [patient] = create_people(1)
+        _insert(Prediction, PREDICTION_COLUMNS, prediction_rows([patient.id], n_predictions))
+        _insert(Recommendation, ['patient_id', 'doctor_id', 'content', 'created_at'],
+                recommendation_rows([patient], 10))
+        refresh_latest_predictions()
+
+        patient_client, doctor_client = Client(), Client()
+        patient_client.force_login(patient.user)
+        doctor_client.force_login(doctor.user)
+        pages = [('profile', patient_client, reverse('profile')),
+                 ('patient_detail', doctor_client, reverse('patient_detail', args=[patient.id]))]
+
+        default_page = predictor.views.PREDICTIONS_PAGE_SIZE
+        paged = render_times(pages, n_requests)
+        predictor.views.PREDICTIONS_PAGE_SIZE = n_predictions
+        try:
+            whole = render_times(pages, n_requests)
+        finally:
+            predictor.views.PREDICTIONS_PAGE_SIZE = default_page
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    report(f"{n_predictions} predictions, {default_page} per page", paged, unit='ms')
+    report(f"{n_predictions} predictions on one page", whole, unit='ms')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,103 @@
+"""Synthetic users, patients and prediction histories for the database benchmarks.
+
+Rows are written with executemany on a throw-away test database; the feature
+values are sampled from static/heart.csv.
+"""
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import pandas as pd
+from django.db import connection, transaction
+
+from predictor.models import CustomUser, Doctor, Patient, Prediction, Recommendation
+
+from .common import HEART_CSV
+
+PREDICTION_COLUMNS = ['patient_id', 'age', 'gender', 'chest_pain_type', 'restingbp', 'cholesterol',
+                      'fastingbs', 'restingecg', 'maxhr', 'exerciseangina', 'oldpeak', 'st_slope',
+                      'heart_disease_risk', 'prediction_date', 'model_version',
+                      'suggested_recommendations']
+
+
+def _insert(model, columns, rows, batch_size=50_000):
+    table = connection.ops.quote_name(model._meta.db_table)
+    names = ', '.join(connection.ops.quote_name(c) for c in columns)
+    placeholders = ', '.join(['%s'] * len(columns))
+    sql = f'INSERT INTO {table} ({names}) VALUES ({placeholders})'
+    with connection.cursor() as cursor:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+
+
+def create_people(n_patients, patients_per_doctor=100):
+    n_doctors = max(1, n_patients // patients_per_doctor)
+    users = CustomUser.objects.bulk_create(
+        [CustomUser(username=f'doctor{i}@example.com', email=f'doctor{i}@example.com',
+                    password='!', user_type='doctor', first_name='Doc', last_name=str(i))
+         for i in range(n_doctors)] +
+        [CustomUser(username=f'patient{i}@example.com', email=f'patient{i}@example.com',
+                    password='!', user_type='patient', first_name='Pat', last_name=str(i))
+         for i in range(n_patients)],
+        batch_size=1000)
+    doctors = Doctor.objects.bulk_create(
+        [Doctor(user=user, doctor_id=f'{i:010d}') for i, user in enumerate(users[:n_doctors])],
+        batch_size=1000)
+    patients = Patient.objects.bulk_create(
+        [Patient(user=user, date_of_birth=datetime(1970, 1, 1).date(), doctor=doctors[i % n_doctors])
+         for i, user in enumerate(users[n_doctors:])],
+        batch_size=1000)
+    return doctors, patients
+
+
+def prediction_rows(patient_ids, n_predictions, seed=0, days=3 * 365):
+    rng = random.Random(seed)
+    samples = pd.read_csv(HEART_CSV).to_dict('records')
+    end = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+    adapt = connection.ops.adapt_datetimefield_value
+    for _ in range(n_predictions):
+        r = rng.choice(samples)
+        date = end - timedelta(seconds=rng.randrange(days * 86400))
+        yield (rng.choice(patient_ids), int(r['Age']), r['Gender'], r['ChestPainType'],
+               int(r['RestingBP']), int(r['Cholesterol']), int(r['FastingBS']), r['RestingECG'],
+               int(r['MaxHR']), r['ExerciseAngina'], float(r['Oldpeak']), r['ST_Slope'],
+               'have' if r['HeartDisease'] == 1 else "don't have", adapt(date), 'rf-v1', '[]')
+
+
+def recommendation_rows(patients, per_patient, seed=0):
+    rng = random.Random(seed)
+    adapt = connection.ops.adapt_datetimefield_value
+    end = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+    for patient in patients:
+        for i in range(per_patient):
+            date = end - timedelta(seconds=rng.randrange(3 * 365 * 86400))
+            yield (patient.id, patient.doctor_id, f'Recommendation {i}', adapt(date))
+
+
+def seed(n_predictions, n_patients, recommendations_per_patient=5):
+    """Fill the current database; returns the patient ids."""
+    with transaction.atomic():
+        doctors, patients = create_people(n_patients)
+        patient_ids = [p.id for p in patients]
+        _insert(Prediction, PREDICTION_COLUMNS, prediction_rows(patient_ids, n_predictions))
+        _insert(Recommendation, ['patient_id', 'doctor_id', 'content', 'created_at'],
+                recommendation_rows(patients, recommendations_per_patient))
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return patient_ids
+
+
+@contextmanager
+def seeded_database(**kwargs):
+    """A migrated test database filled by ``seed``, destroyed afterwards."""
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        yield seed(**kwargs)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
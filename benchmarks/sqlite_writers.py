@@ -0,0 +1,132 @@
+"""Prediction inserts from several writer processes at once, as heart() does
+them, with SQLite's default settings vs the performance mode
+(PREDICTOR_SQLITE_PERFORMANCE) and with the write-behind batcher on top.
+
+Every process runs ``threads`` request threads, each saving ``n_per_thread``
+predictions one at a time through save_predictions, against a throw-away
+database file; a reader process loads patient histories meanwhile. Saves
+that still fail with "database is locked" are counted as errors.
+
+    python -m benchmarks.sqlite_writers [processes] [threads] [n_per_thread]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+
+from predictor.batching import WriteBehindBatcher
+from predictor.models import Patient, Prediction
+from predictor.utils import build_prediction, save_predictions
+from predictor.views import PREDICTION_ORDERING
+
+from .common import load_records
+from .seed import create_people
+
+MODES = [
+    ('default', False, False),
+    ('performance', True, False),
+    ('performance + write-behind', True, True),
+]
+
+
+def writer(patient_ids, records, performance, write_behind, results):
+    settings.PREDICTOR_SQLITE_PERFORMANCE = performance
+    batcher = WriteBehindBatcher(save_predictions) if write_behind else None
+    errors = []
+
+    def request_thread(patient_id):
+        patient = Patient(id=patient_id)
+        for data in records:
+            prediction = build_prediction(patient, data, 0, model_version='bench')
+            try:
+                if batcher is not None:
+                    batcher.submit(prediction)
+                else:
+                    save_predictions([prediction])
+            except OperationalError:
+                errors.append(1)
+        connection.close()
+
+    threads = [threading.Thread(target=request_thread, args=(pid,)) for pid in patient_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if batcher is not None:
+        batcher.flush()
+    results.put(len(errors))
+
+
+def reader(patient_ids, performance, stop, results):
+    settings.PREDICTOR_SQLITE_PERFORMANCE = performance
+    reads, latencies = 0, []
+    while not stop.is_set():
+        for patient_id in patient_ids:
+            start = time.perf_counter()
+            try:
+                list(Prediction.objects.filter(patient_id=patient_id).order_by(*PREDICTION_ORDERING)[:20])
+            except OperationalError:
+                continue
+            latencies.append(time.perf_counter() - start)
+            reads += 1
+    results.put((reads, max(latencies, default=0.0)))
+
+
+def run(path, performance, write_behind, processes, threads, n_per_thread):
+    connection.settings_dict['NAME'] = path
+    connection.settings_dict['CONN_MAX_AGE'] = 600 if performance else 0
+    settings.PREDICTOR_SQLITE_PERFORMANCE = performance
+    call_command('migrate', verbosity=0)
+    _, patients = create_people(processes * threads)
+    patient_ids = [patient.id for patient in patients]
+    records = load_records(n_per_thread)
+    connections.close_all()  # nothing open may be inherited by the forked processes
+
+    context = multiprocessing.get_context('fork')
+    results, reads, stop = context.Queue(), context.Queue(), context.Event()
+    workers = [context.Process(target=writer, args=(patient_ids[i * threads:(i + 1) * threads],
+                                                    records, performance, write_behind, results))
+               for i in range(processes)]
+    read_process = context.Process(target=reader, args=(patient_ids, performance, stop, reads))
+    read_process.start()
+    start = time.perf_counter()
+    for process in workers:
+        process.start()
+    errors = sum(results.get() for _ in workers)
+    elapsed = time.perf_counter() - start
+    for process in workers:
+        process.join()
+    stop.set()
+    n_reads, worst_read = reads.get()
+    read_process.join()
+
+    saved = Prediction.objects.count()
+    connections.close_all()
+    return {'saved': saved, 'errors': errors, 'inserts_per_s': saved / elapsed,
+            'reads_per_s': n_reads / elapsed, 'worst_read': worst_read}
+
+
+def main(processes=4, threads=4, n_per_thread=200):
+    rows = []
+    for name, performance, write_behind in MODES:
+        with tempfile.TemporaryDirectory() as tmp:
+            result = run(os.path.join(tmp, 'writers.sqlite3'), performance, write_behind,
+                         processes, threads, n_per_thread)
+        rows.append((name, result))
+
+    print(f"{processes} writer processes x {threads} threads x {n_per_thread} predictions, "
+          f"plus one reader")
+    print(f"  {'':28}{'inserts/s':>10}{'errors':>8}{'reads/s':>10}{'worst read ms':>15}")
+    for name, r in rows:
+        print(f"  {name:28}{r['inserts_per_s']:10.0f}{r['errors']:8}{r['reads_per_s']:10.0f}"
+              f"{r['worst_read'] * 1e3:15.1f}")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,259 @@
+"""The whole prediction stack in one run, saved as JSON and compared to a baseline.
+
+Measures single-row and batch scoring for every model version, cold-start
+load time and memory, the heart() form POST end to end, and profile /
+patient_detail rendering for patients with increasingly long histories.
+Everything runs offline against a throw-away test database, with records
+sampled from static/heart.csv under a fixed seed, so two runs on the same
+machine measure the same work.
+
+    python -m benchmarks.suite [--quick] [--output results.json]
+                               [--baseline baseline.json] [--tolerance 0.25]
+    python -m benchmarks.suite --compare baseline.json results.json
+
+Every metric is a median over several rounds and lower is better
+(seconds or kB). With a baseline, metrics that got slower or bigger by more
+than the tolerance are reported as regressions and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import django
+import numpy as np
+import pandas as pd
+import sklearn
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+
+from predictor.model_registry import ModelBundle, list_versions
+from predictor.models import Prediction, Recommendation
+from predictor.utils import refresh_latest_predictions
+
+from . import model_loading
+from .common import BASE_DIR, CSV_TO_FORM, MODELS_PATH, load_records
+from .seed import PREDICTION_COLUMNS, _insert, create_people, prediction_rows, recommendation_rows
+
+SEED = 0
+SIZES = {
+    'full': {'records': 2_000, 'batch': 1_000, 'posts': 300, 'histories': [10, 100, 1_000, 10_000],
+             'cold_starts': 3, 'repeat': 5},
+    'quick': {'records': 200, 'batch': 200, 'posts': 50, 'histories': [10, 100, 1_000],
+              'cold_starts': 1, 'repeat': 3},
+}
+
+
+def measure(func, repeat, number=1):
+    """Median seconds per call of ``func`` over ``repeat`` rounds of ``number`` calls, after one warm-up."""
+    func()
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        rounds.append((time.perf_counter() - start) / number)
+    return statistics.median(rounds)
+
+
+def metric(value, unit):
+    return {'value': value, 'unit': unit}
+
+
+def bench_inference(sizes):
+    records = load_records(sizes['records'], seed=SEED)
+    batch = records[:sizes['batch']]
+    frame = pd.DataFrame([{col: data[field] for col, field in CSV_TO_FORM.items() if col != 'Sex'}
+                          for data in batch])
+    frame['FastingBS'] = frame['FastingBS'].astype(int)
+    results = {}
+    for version in list_versions(MODELS_PATH):
+        bundle = ModelBundle(version, MODELS_PATH)
+        single = measure(lambda: [bundle.predict(data) for data in records], sizes['repeat'])
+        results[f'inference.{version}.single_row'] = metric(single / len(records), 's/record')
+        many = measure(lambda: bundle.predict_many(batch), sizes['repeat'])
+        results[f'inference.{version}.batch'] = metric(many / len(batch), 's/record')
+        whole = measure(lambda: bundle.predict_frame(frame), sizes['repeat'])
+        results[f'inference.{version}.frame'] = metric(whole / len(batch), 's/record')
+    return results
+
+
+def bench_cold_start(sizes):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for variant, path in model_loading.variants(tmp):
+            runs = [model_loading.run(variant, path) for _ in range(sizes['cold_starts'])]
+            results[f'cold_start.{variant}.first_prediction'] = metric(
+                statistics.median(r['first_prediction'] for r in runs), 's')
+            for key in ('VmRSS', 'RssAnon'):
+                results[f'cold_start.{variant}.{key}'] = metric(
+                    statistics.median(r[key] for r in runs), 'kB')
+    return results
+
+
+def seed_histories(histories):
+    """One patient per history length, all under the same doctor."""
+    doctors, patients = create_people(len(histories))
+    for i, (patient, size) in enumerate(zip(patients, histories)):
+        _insert(Prediction, PREDICTION_COLUMNS, prediction_rows([patient.id], size, seed=SEED + i))
+        _insert(Recommendation, ['patient_id', 'doctor_id', 'content', 'created_at'],
+                recommendation_rows([patient], 5, seed=SEED + i))
+    refresh_latest_predictions()
+    return doctors[0], patients
+
+
+def bench_heart_post(sizes, patient):
+    client = Client()
+    client.force_login(patient.user)
+    records = iter(load_records(sizes['posts'] * (sizes['repeat'] + 1), seed=SEED))
+    url = reverse('heart')
+
+    def post():
+        response = client.post(url, next(records))
+        assert response.status_code == 302, response.status_code
+
+    return {'heart.post': metric(measure(post, sizes['repeat'], sizes['posts']), 's')}
+
+
+def bench_pages(sizes, doctor, patients):
+    results = {}
+    doctor_client = Client()
+    doctor_client.force_login(doctor.user)
+    for patient, size in zip(patients, sizes['histories']):
+        client = Client()
+        client.force_login(patient.user)
+        detail = reverse('patient_detail', args=[patient.id])
+        for name, get in (('profile', lambda: client.get(reverse('profile'))),
+                          ('patient_detail', lambda: doctor_client.get(detail))):
+            def render():
+                assert get().status_code == 200
+            results[f'pages.{name}.history_{size}'] = metric(measure(render, sizes['repeat'], 10), 's')
+    return results
+
+
+def bench_database(sizes):
+    setup_test_environment()  # allows the test client's 'testserver' host
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        doctor, patients = seed_histories(sizes['histories'])
+        results = bench_pages(sizes, doctor, patients)
+        results.update(bench_heart_post(sizes, patients[0]))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'django': django.get_version(),
+        'sklearn': sklearn.__version__,
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def run(quick=False):
+    sizes = SIZES['quick' if quick else 'full']
+    metrics = {}
+    for name, bench in (('inference', bench_inference), ('cold start', bench_cold_start),
+                        ('database', bench_database)):
+        print(f"running {name} benchmarks...", file=sys.stderr)
+        metrics.update(bench(sizes))
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'sizes': sizes,
+        'seed': SEED,
+        'metrics': metrics,
+    }
+
+
+def compare(baseline, current, tolerance=0.25):
+    """Rows of (name, baseline value, current value, ratio, status) for metrics in both runs."""
+    rows = []
+    for name, result in current['metrics'].items():
+        before = baseline['metrics'].get(name)
+        if before is None:
+            rows.append((name, None, result['value'], None, 'new'))
+            continue
+        ratio = result['value'] / before['value'] if before['value'] else float('inf')
+        status = ('REGRESSION' if ratio > 1 + tolerance else
+                  'improved' if ratio < 1 / (1 + tolerance) else 'ok')
+        rows.append((name, before['value'], result['value'], ratio, status))
+    return rows
+
+
+def print_comparison(rows, baseline, current):
+    environments = [{k: v for k, v in run['environment'].items() if k != 'commit'}
+                    for run in (baseline, current)]
+    if baseline['sizes'] != current['sizes'] or environments[0] != environments[1]:
+        print("note: the runs differ in sizes or environment, compare with care")
+    width = max(len(row[0]) for row in rows)
+    for name, before, after, ratio, status in rows:
+        before_text = '' if before is None else f'{before:.4g}'
+        ratio_text = '' if ratio is None else f'x{ratio:.2f}'
+        print(f"  {name:<{width}}  {before_text:>10} -> {after:<10.4g} {ratio_text:>7}  {status}")
+
+
+def print_results(results):
+    width = max(len(name) for name in results['metrics'])
+    for name, result in results['metrics'].items():
+        print(f"  {name:<{width}}  {result['value']:12.4g} {result['unit']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the prediction stack.")
+    parser.add_argument('--quick', action='store_true', help="Smaller sizes, for a fast check.")
+    parser.add_argument('--output', help="Where to save the results (default: "
+                                         "benchmarks/results/<timestamp>.json).")
+    parser.add_argument('--baseline', help="Earlier results to compare this run against.")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Slowdown that counts as a regression (default 0.25, i.e. 25%%).")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'RESULTS'),
+                        help="Only compare two saved runs.")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        baseline, results = (json.load(open(path)) for path in args.compare)
+    else:
+        results = run(args.quick)
+        output = args.output or os.path.join(
+            BASE_DIR, 'benchmarks', 'results', datetime.now().strftime('%Y%m%d-%H%M%S.json'))
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=4)
+        print_results(results)
+        print(f"Saved results to {output}")
+        if not args.baseline:
+            return 0
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    rows = compare(baseline, results, args.tolerance)
+    print_comparison(rows, baseline, results)
+    regressions = [row[0] for row in rows if row[4] == 'REGRESSION']
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -43,11 +43,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "predictor.middleware.QueryMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "predictor.middleware.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -59,6 +61,9 @@ TEMPLATES = [
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": [TEMPLATE_DIR],
         "APP_DIRS": True,
+        # Without explicit "loaders" Django wraps these in the cached loader,
+        # so templates are compiled once per process (runserver's autoreloader
+        # resets it when a template changes).
         "OPTIONS": {
             "context_processors": [
                 "django.template.context_processors.debug",
@@ -76,14 +81,54 @@ WSGI_APPLICATION = "heart3.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# SQLite performance mode (see predictor.sqlite): WAL, synchronous=NORMAL, a
+# busy timeout, a bigger page cache and mmap on every connection, and
+# connections kept open between requests. True uses the defaults in
+# predictor.sqlite.PERFORMANCE_PRAGMAS; a dict overrides some of them.
+PREDICTOR_SQLITE_PERFORMANCE = False
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": 600 if PREDICTOR_SQLITE_PERFORMANCE else 0,
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Model outputs keyed on the encoded inputs; point this at a shared
+    # backend (e.g. Redis or memcached) to share hits between workers.
+    "predictions": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "predictions",
+        "TIMEOUT": 60 * 60 * 24,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    # Rendered prediction cards and recommendations (see predictor.fragments).
+    # Edits and deletes only clear the fragments of the process that made
+    # them, so with a per-process cache other workers can show a stale card
+    # or doctor name until TIMEOUT; keep it short here, or point this at a
+    # shared backend (e.g. Redis or memcached) and raise it.
+    "fragments": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "fragments",
+        "TIMEOUT": 60 * 5,
+        "OPTIONS": {"MAX_ENTRIES": 20000},
+    },
+}
+
+# Cache alias for rendered history fragments; None renders them on every request.
+PREDICTOR_FRAGMENT_CACHE_ALIAS = 'fragments'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -131,6 +176,60 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 LOGIN_URL = '/login/'
 
 MEDIA_URL = '/media/'
+
+# Score concurrent heart() submissions together, e.g. {'max_batch': 32, 'max_wait_ms': 5}.
+PREDICTOR_MICRO_BATCH = None
+
+# Most records api/predict/batch/ scores in one request; longer lists get a 413.
+PREDICTOR_BATCH_MAX_RECORDS = 500
+
+# Seconds between checks of trained_models/ACTIVE for a newly activated model version.
+PREDICTOR_MODEL_CHECK_INTERVAL = 5.0
+
+# Cache alias used for prediction results; None disables the cache.
+PREDICTOR_CACHE_ALIAS = 'predictions'
+
+# Rows per keyset page of prediction history and of a doctor's patient list.
+PREDICTIONS_PAGE_SIZE = 20
+PATIENTS_PAGE_SIZE = 50
+
+# Serve heart/ with the async view (under ASGI). The inference pool runs at
+# most max_workers predictions at once and answers 503 beyond max_pending;
+# kind is 'thread' or 'process'.
+PREDICTOR_ASYNC_HEART = False
+PREDICTOR_ASYNC_POOL = {'kind': 'thread', 'max_workers': 4, 'max_pending': 32}
+
+# Return from heart() right after scoring and save the prediction from the job
+# queue instead; needs `manage.py run_jobs` running.
+PREDICTOR_DEFERRED_SAVE = False
+
+# Save heart() predictions from a background thread in batches, e.g.
+# {'max_batch': 64, 'max_wait_ms': 50}: one transaction for many requests.
+# Like PREDICTOR_DEFERRED_SAVE the page shows the result instead of the
+# profile, and predictions still queued if the process dies are lost.
+PREDICTOR_WRITE_BEHIND = None
+
+# Seconds a doctor's dashboard stays in the default cache. Saving or deleting a
+# prediction of one of their patients drops it earlier, but only in the cache
+# of the process that saved it unless the default cache is shared.
+PREDICTOR_DASHBOARD_CACHE_TIMEOUT = 300
+
+# Per-stage scoring timers, per-view query counts and model load times, served
+# at /metrics in the Prometheus text format to INTERNAL_IPS and staff users.
+# False turns the timers into no-ops and drops QueryMetricsMiddleware.
+PREDICTOR_METRICS = True
+INTERNAL_IPS = ['127.0.0.1']
+
+# Run requests under cProfile and keep the stats in PREDICTOR_PROFILE_DIR, listed
+# slowest first in the admin: a PREDICTOR_PROFILE_SAMPLE_RATE fraction of heart,
+# profile and patient_detail requests, plus any request carrying the token a
+# staff user finds on that admin page. Only the newest PREDICTOR_PROFILE_KEEP
+# captures are kept.
+PREDICTOR_PROFILING = False
+PREDICTOR_PROFILE_SAMPLE_RATE = 0.01
+PREDICTOR_PROFILE_DIR = BASE_DIR / 'profiles'
+PREDICTOR_PROFILE_KEEP = 500
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -1,6 +1,12 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, Doctor, Patient, Recommendation, Prediction
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from . import profiling
+from .models import (CustomUser, DailyPredictionStats, Doctor, Job, Patient, Recommendation,
+                     Prediction, RequestProfile)
 
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
@@ -27,3 +33,80 @@ admin.site.register(Patient)
 admin.site.register(Prediction)
 admin.site.register(Doctor)
 admin.site.register(Recommendation)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'status', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'task')
+
+
+@admin.register(DailyPredictionStats)
+class DailyPredictionStatsAdmin(admin.ModelAdmin):
+    list_display = ('date', 'gender', 'age_band', 'chest_pain_type', 'predictions', 'high_risk')
+    list_filter = ('gender', 'age_band', 'chest_pain_type')
+    date_hierarchy = 'date'
+    ordering = ('-date', 'gender', 'age_band', 'chest_pain_type')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Captured request profiles, slowest first; filter by view for heart, profile and patient_detail."""
+    list_display = ('created_at', 'view_name', 'method', 'url', 'user_type', 'status_code',
+                    'duration_ms', 'query_count', 'trigger')
+    list_filter = ('view_name', 'trigger', 'user_type')
+    ordering = ('-duration',)
+    readonly_fields = ('created_at', 'method', 'url', 'view_name', 'user_type', 'status_code',
+                       'duration', 'query_count', 'query_time', 'trigger', 'download', 'top_functions')
+    exclude = ('stats_file',)
+    change_list_template = 'admin/predictor/requestprofile/change_list.html'
+
+    @admin.display(description='Duration (ms)', ordering='duration')
+    def duration_ms(self, obj):
+        return f'{obj.duration * 1000:.1f}'
+
+    @admin.display(description='pstats file')
+    def download(self, obj):
+        return format_html('<a href="{}">{}</a>',
+                           reverse('admin:predictor_requestprofile_download', args=[obj.pk]),
+                           obj.stats_file)
+
+    @admin.display(description='Top functions by cumulative time')
+    def top_functions(self, obj):
+        return format_html('<pre>{}</pre>', profiling.top_functions(obj))
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download_view),
+                 name='predictor_requestprofile_download'),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        try:
+            return FileResponse(open(profiling.stats_path(profile), 'rb'), as_attachment=True,
+                                filename=profile.stats_file)
+        except FileNotFoundError:
+            raise Http404("The stats file is gone.")
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {**(extra_context or {}), 'profile_token': profiling.profile_token(request.user)}
+        return super().changelist_view(request, extra_context)
+
+    def delete_queryset(self, request, queryset):
+        profiling.delete_profiles(queryset)
+
+    def delete_model(self, request, obj):
+        profiling.delete_profiles([obj])
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
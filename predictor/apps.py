@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class PredictorConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "predictor"
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+        from . import metrics, signals, sqlite, tasks  # noqa: F401
+        metrics.enabled = getattr(settings, 'PREDICTOR_METRICS', True)
+        connection_created.connect(sqlite.configure_connection)
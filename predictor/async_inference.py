@@ -0,0 +1,55 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+
+from .scoring import init_django
+
+
+class PoolSaturated(Exception):
+    """Raised instead of queueing when the inference pool is full."""
+
+
+class InferencePool:
+    """Bounded executor for CPU-bound scoring called from async views.
+
+    At most ``max_workers`` jobs run at once and at most ``max_pending`` are
+    accepted (running or queued); beyond that ``run`` raises PoolSaturated
+    right away so the caller can shed load instead of piling up requests.
+    """
+
+    def __init__(self, kind='thread', max_workers=4, max_pending=32):
+        if kind == 'process':
+            self.executor = ProcessPoolExecutor(max_workers, initializer=init_django)
+        elif kind == 'thread':
+            self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix='predictor-inference')
+        else:
+            raise ValueError(f"Unknown pool kind '{kind}'.")
+        self.max_pending = max_pending
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise PoolSaturated()
+            self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_inference_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = InferencePool(**getattr(settings, 'PREDICTOR_ASYNC_POOL', {}))
+    return _pool
@@ -0,0 +1,137 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+logger = logging.getLogger(__name__)
+
+
+class _BatchThread:
+    """A queue drained in batches by one background thread, started on first use."""
+    thread_name = 'predictor-batch'
+
+    def __init__(self, max_batch, max_wait_ms):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name=self.thread_name,
+                                                    daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+
+class MicroBatcher(_BatchThread):
+    """Collects concurrent single-record predictions and scores them together.
+
+    Callers get a Future back from ``submit``. A background thread waits up to
+    ``max_wait_ms`` after the first pending record (or until ``max_batch``
+    records are queued) and then runs ``predict_many`` once for all of them.
+    """
+    thread_name = 'predictor-microbatch'
+
+    def __init__(self, predict_many, max_batch=32, max_wait_ms=5):
+        super().__init__(max_batch, max_wait_ms)
+        self.predict_many = predict_many
+
+    def submit(self, record):
+        future = Future()
+        self._ensure_started()
+        self._queue.put((record, future))
+        return future
+
+    def predict(self, record, timeout=None):
+        return self.submit(record).result(timeout)
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            records = [record for record, _ in batch]
+            try:
+                results = self.predict_many(records)
+            except Exception:
+                # Don't let one bad record fail the others queued with it.
+                for record, future in batch:
+                    try:
+                        future.set_result(self.predict_many([record])[0])
+                    except Exception as exc:
+                        future.set_exception(exc)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+
+
+class WriteBehindBatcher(_BatchThread):
+    """Saves objects from a background thread, many per transaction.
+
+    ``submit`` returns at once with a Future for the save. The thread waits
+    up to ``max_wait_ms`` after the first queued object (or until
+    ``max_batch`` are queued) and passes them all to ``save_many``, so
+    concurrent requests take the database's write lock once per batch
+    instead of once each. Objects still queued when the process dies are
+    lost; ``flush`` waits for the queue to drain.
+    """
+    thread_name = 'predictor-write-behind'
+
+    def __init__(self, save_many, max_batch=64, max_wait_ms=50):
+        super().__init__(max_batch, max_wait_ms)
+        self.save_many = save_many
+
+    def submit(self, obj):
+        future = Future()
+        self._ensure_started()
+        self._queue.put((obj, future))
+        return future
+
+    def flush(self, timeout=None):
+        """Wait until everything submitted so far is saved; False on timeout."""
+        done = self._queue.all_tasks_done
+        with done:
+            return done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def _save(self, batch):
+        try:
+            self.save_many([obj for obj, _ in batch])
+        except Exception as exc:
+            if len(batch) > 1:
+                # Don't let one bad object fail the others queued with it.
+                for item in batch:
+                    self._save([item])
+                return
+            logger.exception("Could not save %r.", batch[0][0])
+            batch[0][1].set_exception(exc)
+        else:
+            for _, future in batch:
+                future.set_result(None)
+
+    def _run(self):
+        from django.db import close_old_connections
+        while True:
+            batch = self._collect()
+            # Outside a request nothing else recycles this thread's connection.
+            close_old_connections()
+            try:
+                self._save(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
@@ -0,0 +1,126 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, ExpressionWrapper, F, IntegerField, Max, Min, Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Patient, Prediction
+
+
+CACHE_TIMEOUT = getattr(settings, 'PREDICTOR_DASHBOARD_CACHE_TIMEOUT', 300)
+
+# Field of the latest prediction -> (label, histogram bucket width).
+DISTRIBUTIONS = {
+    'cholesterol': ('Cholesterol', 50),
+    'restingbp': ('Resting BP', 20),
+    'maxhr': ('Max HR', 20),
+}
+
+
+def cache_key(doctor_id):
+    return f'predictor:dashboard:{doctor_id}'
+
+
+def month_start(months_ago):
+    now = timezone.localtime()
+    month = now.year * 12 + now.month - 1 - months_ago
+    return now.replace(year=month // 12, month=month % 12 + 1, day=1,
+                       hour=0, minute=0, second=0, microsecond=0)
+
+
+def risk_counts(patients):
+    counts = dict(patients.values('latest_risk').annotate(count=Count('id'))
+                  .values_list('latest_risk', 'count'))
+    return {
+        'have': counts.get('have', 0),
+        "don't have": counts.get("don't have", 0),
+        'no prediction': counts.get('', 0),
+    }
+
+
+def monthly_trend(predictions, months=12):
+    """Predictions and high-risk predictions per month, oldest first."""
+    rows = (predictions.filter(prediction_date__gte=month_start(months - 1))
+            .annotate(month=TruncMonth('prediction_date'))
+            .values('month')
+            .annotate(total=Count('id'), high_risk=Count('id', filter=Q(heart_disease_risk='have')))
+            .order_by('month'))
+    trend, cumulative = [], 0
+    for row in rows:
+        cumulative += row['total']
+        trend.append({
+            'month': row['month'].date().isoformat(),
+            'total': row['total'],
+            'high_risk': row['high_risk'],
+            'cumulative': cumulative,
+        })
+    return trend
+
+
+def distributions(patients):
+    """Summary statistics and a histogram of each DISTRIBUTIONS field over the
+    patients' latest predictions."""
+    latest = Prediction.objects.filter(
+        id__in=patients.filter(latest_prediction__isnull=False).values('latest_prediction'))
+    summary = latest.aggregate(**{
+        f'{field}_{name}': aggregate(field)
+        for field in DISTRIBUTIONS
+        for name, aggregate in (('min', Min), ('max', Max), ('avg', Avg))
+    })
+    result = {}
+    for field, (label, width) in DISTRIBUTIONS.items():
+        bucket = ExpressionWrapper(F(field) / width * width, output_field=IntegerField())
+        histogram = (latest.annotate(bucket=bucket).values('bucket')
+                     .annotate(count=Count('id')).order_by('bucket'))
+        result[field] = {
+            'label': label,
+            'min': summary[f'{field}_min'],
+            'max': summary[f'{field}_max'],
+            'avg': summary[f'{field}_avg'],
+            'bucket_width': width,
+            'histogram': [{'from': row['bucket'], 'count': row['count']} for row in histogram],
+        }
+    return result
+
+
+def compute_dashboard(doctor, months=12):
+    patients = Patient.objects.filter(doctor=doctor)
+    return {
+        'patients': patients.count(),
+        'risk_counts': risk_counts(patients),
+        'trend': monthly_trend(Prediction.objects.filter(patient__doctor=doctor), months),
+        'distributions': distributions(patients),
+    }
+
+
+def doctor_dashboard(doctor):
+    """compute_dashboard(doctor), cached until one of the doctor's patients changes."""
+    key = cache_key(doctor.id)
+    data = cache.get(key)
+    if data is None:
+        data = compute_dashboard(doctor)
+        cache.set(key, data, CACHE_TIMEOUT)
+    return data
+
+
+def invalidate_dashboards(doctor_ids):
+    """Drop the cached dashboards of ``doctor_ids`` once the current transaction commits."""
+    keys = [cache_key(doctor_id) for doctor_id in set(doctor_ids) if doctor_id is not None]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_for_predictions(predictions):
+    """invalidate_dashboards for the doctors of the predictions' patients."""
+    doctor_ids, patient_ids = set(), set()
+    for prediction in predictions:
+        if Prediction.patient.is_cached(prediction):
+            doctor_ids.add(prediction.patient.doctor_id)
+        else:
+            patient_ids.add(prediction.patient_id)
+    patient_ids = sorted(patient_ids)
+    for i in range(0, len(patient_ids), 500):
+        doctor_ids.update(Patient.objects.filter(pk__in=patient_ids[i:i + 500])
+                          .values_list('doctor_id', flat=True).distinct())
+    invalidate_dashboards(doctor_ids)
@@ -0,0 +1,124 @@
+import json
+import os
+
+import numpy as np
+
+
+class FlatForest:
+    """A fitted RandomForestClassifier flattened into contiguous arrays.
+
+    All trees share one node table; ``roots`` holds the index of each tree's
+    root. Leaves point back to themselves, so every (tree, row) pair can be
+    walked in lock-step for ``max_depth`` steps without branching. Leaf values
+    are stored already normalized the way DecisionTreeClassifier.predict_proba
+    normalizes them, and are summed over trees in estimator order, so the
+    result is identical to ``model.predict`` / ``model.predict_proba``.
+    """
+
+    # children[2 * node] is the left child, children[2 * node + 1] the right one.
+    ARRAYS = ('feature', 'threshold', 'children', 'value', 'roots', 'classes')
+
+    def __init__(self, feature, threshold, children, value, roots, classes, max_depth,
+                 n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.classes = classes
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.n_trees = len(roots)
+
+    @property
+    def left(self):
+        return self.children[0::2]
+
+    @property
+    def right(self):
+        return self.children[1::2]
+
+    @classmethod
+    def from_sklearn(cls, model):
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise ValueError("Only single-output forests can be flattened.")
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            ids = np.arange(offset, offset + n)
+            is_leaf = tree.children_left == -1
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, ids, tree.children_left + offset))
+            rights.append(np.where(is_leaf, ids, tree.children_right + offset))
+
+            proba = tree.value[:, 0, :estimator.n_classes_].copy()
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            proba /= normalizer
+            values.append(proba)
+
+            roots.append(offset)
+            offset += n
+
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children=np.stack([np.concatenate(lefts), np.concatenate(rights)],
+                              axis=1).ravel().astype(np.intp),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            classes=np.asarray(model.classes_),
+            max_depth=max(e.tree_.max_depth for e in model.estimators_),
+            n_features=model.n_features_in_,
+        )
+
+    def save(self, path):
+        """Write one .npy file per array into the directory ``path``."""
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'max_depth': self.max_depth, 'n_features': self.n_features}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load a saved forest; by default the arrays are read-only memory maps,
+        so every process serving the same file shares one page-cached copy."""
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+                  for name in cls.ARRAYS}
+        return cls(**arrays, **meta)
+
+    def apply(self, X):
+        """Leaf index reached by each row in each tree, shape (n_trees, n_rows)."""
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}.")
+        # Trees compare float32 inputs against float64 thresholds, as sklearn does.
+        X = X.astype(np.float32)
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN or infinity.")
+        flat_X = np.ascontiguousarray(X).ravel()
+        row_offsets = np.arange(X.shape[0]) * self.n_features
+        nodes = np.repeat(self.roots[:, np.newaxis], X.shape[0], axis=1)
+        for _ in range(self.max_depth):
+            go_right = flat_X.take(row_offsets + self.feature.take(nodes)) > self.threshold.take(nodes)
+            nodes = self.children.take(2 * nodes + go_right)
+        return nodes
+
+    def predict_proba(self, X):
+        # Summing over axis 0 adds the trees one after another, in the same
+        # order RandomForestClassifier accumulates them.
+        proba = self.value[self.apply(X)].sum(axis=0)
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
@@ -92,7 +92,7 @@ class SelectDoctorForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['doctor'].queryset = Doctor.objects.all()
+        self.fields['doctor'].queryset = Doctor.objects.select_related('user')
         self.fields['doctor'].label_from_instance = self.get_doctor_name
 
     def get_doctor_name(self, doctor):
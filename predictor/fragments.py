@@ -0,0 +1,72 @@
+"""Rendered HTML of single predictions and recommendations, cached by id.
+
+A saved prediction doesn't change, so profile and patient_detail render each
+history card once and afterwards fetch the whole page's worth of cards with a
+single get_many. Editing or deleting a prediction or recommendation (and
+renaming a doctor, whose name recommendations show) drops its fragments
+through the signals in predictor.signals. Queryset .update() bypasses those,
+so clear the fragments of rows changed that way with ``invalidate``.
+
+Invalidation reaches only the cache it runs against, so with a per-process
+(locmem) cache other workers keep their copy until it expires; the cache's
+TIMEOUT bounds how long they can show a stale card.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+
+PREDICTION = ('prediction', 'includes/prediction_card.html')
+# The same card with the labels and spacing profile always had.
+PROFILE_PREDICTION = ('profile_prediction', 'includes/profile_prediction_card.html')
+RECOMMENDATION = ('recommendation', 'includes/recommendation.html')
+PREDICTION_KINDS = (PREDICTION[0], PROFILE_PREDICTION[0])
+
+
+def fragment_cache():
+    alias = getattr(settings, 'PREDICTOR_FRAGMENT_CACHE_ALIAS', None)
+    if not alias:
+        return None
+    try:
+        return caches[alias]
+    except InvalidCacheBackendError:
+        return None
+
+
+def fragment_key(kind, pk):
+    return f'fragment:{kind}:{pk}'
+
+
+def attach(objects, fragment=PREDICTION):
+    """Set ``obj.html`` to the rendered fragment of every object in ``objects``."""
+    kind, template = fragment
+    objects = list(objects)
+    if not objects:
+        return objects
+    cache = fragment_cache()
+    keys = [fragment_key(kind, obj.pk) for obj in objects]
+    cached = cache.get_many(keys) if cache is not None else {}
+    missing = {}
+    for key, obj in zip(keys, objects):
+        html = cached.get(key)
+        if html is None:
+            html = missing[key] = render_to_string(template, {kind: obj})
+        obj.html = mark_safe(html)
+    if missing and cache is not None:
+        cache.set_many(missing)
+    return objects
+
+
+def invalidate(kind, pks):
+    """Drop the cached ``kind`` fragments (one kind or a tuple of them) of ``pks``
+    once the current transaction commits."""
+    cache = fragment_cache()
+    if cache is None:
+        return
+    kinds = (kind,) if isinstance(kind, str) else kind
+    keys = [fragment_key(kind, pk) for pk in pks for kind in kinds]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,204 @@
+import threading
+import warnings
+
+import numpy as np
+
+from . import metrics
+
+
+# Column order the poly/scaler/model pickles were fitted on.
+FEATURE_COLUMNS = ['Age', 'Gender', 'ChestPainType', 'RestingBP', 'Cholesterol', 'FastingBS',
+                   'RestingECG', 'MaxHR', 'ExerciseAngina', 'Oldpeak', 'ST_Slope']
+
+# HeartDiseaseForm field name for every model column.
+FORM_FIELDS = {
+    'Age': 'age',
+    'Gender': 'gender',
+    'ChestPainType': 'cp',
+    'RestingBP': 'trestbps',
+    'Cholesterol': 'chol',
+    'FastingBS': 'fbs',
+    'RestingECG': 'restecg',
+    'MaxHR': 'maxhr',
+    'ExerciseAngina': 'exang',
+    'Oldpeak': 'oldpeak',
+    'ST_Slope': 'slope',
+}
+
+
+def build_lookup_tables(label_encoders):
+    """Turn fitted LabelEncoders into plain category -> code dicts."""
+    return {
+        col: {category: float(code) for code, category in enumerate(le.classes_)}
+        for col, le in label_encoders.items()
+    }
+
+
+class FeatureCompiler:
+    """PolynomialFeatures (degree <= 2) and StandardScaler fused into one step.
+
+    Every output column is the product of two input columns, where a virtual
+    column of ones stands in for the missing factor of linear and bias terms.
+    The arithmetic is the same as poly.transform followed by scaler.transform,
+    so the outputs are bit-identical.
+    """
+
+    def __init__(self, n_input_features, left, right, mean, scale):
+        self.n_input_features = int(n_input_features)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.right = np.ascontiguousarray(right, dtype=np.intp)
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float64)
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float64)
+        self.n_output_features = len(self.left)
+        self._local = threading.local()
+
+    @classmethod
+    def from_transformers(cls, poly, scaler):
+        n_in = poly.powers_.shape[1]
+        ones = n_in  # index of the virtual column of ones
+        left, right = [], []
+        for powers in poly.powers_:
+            if powers.sum() > 2:
+                raise ValueError("Only polynomial features of degree <= 2 can be compiled.")
+            factors = [i for i in np.flatnonzero(powers) for _ in range(powers[i])]
+            factors += [ones] * (2 - len(factors))
+            left.append(factors[0])
+            right.append(factors[1])
+        return cls(n_in, left, right, scaler.mean_, scaler.scale_)
+
+    def save(self, path):
+        arrays = {'n_input_features': np.array(self.n_input_features),
+                  'left': self.left, 'right': self.right}
+        if self.mean is not None:
+            arrays['mean'] = self.mean
+        if self.scale is not None:
+            arrays['scale'] = self.scale
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['n_input_features'], data['left'], data['right'],
+                       data['mean'] if 'mean' in data else None,
+                       data['scale'] if 'scale' in data else None)
+
+    def _scratch(self, n_rows):
+        local = self._local
+        if getattr(local, 'rows', 0) < n_rows:
+            local.rows = n_rows
+            local.extended = np.empty((n_rows, self.n_input_features + 1), dtype=np.float64)
+            local.extended[:, -1] = 1.0
+            local.factor = np.empty((n_rows, self.n_output_features), dtype=np.float64)
+            local.out = np.empty((n_rows, self.n_output_features), dtype=np.float64)
+        return local.extended[:n_rows], local.factor[:n_rows], local.out[:n_rows]
+
+    def transform(self, X, out=None):
+        """Expand and standardize X (n_rows x n_inputs).
+
+        Without ``out`` the result lives in a per-thread buffer that is reused
+        by the next call, so copy it if it has to outlive the request.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_input_features:
+            raise ValueError(f"Expected {self.n_input_features} features, got {X.shape[1]}.")
+        extended, factor, buffer = self._scratch(X.shape[0])
+        if out is None:
+            out = buffer
+        extended[:, :-1] = X
+        np.take(extended, self.left, axis=1, out=out)
+        np.take(extended, self.right, axis=1, out=factor)
+        out *= factor
+        if self.mean is not None:
+            out -= self.mean
+        if self.scale is not None:
+            out /= self.scale
+        return out
+
+
+class InferenceEngine:
+    """Scores HeartDiseaseForm.cleaned_data without going through pandas.
+
+    Produces exactly the same feature values as running a one-row DataFrame
+    through the bundle's pipeline (see predictor.pipeline), so predictions
+    match it.
+    """
+
+    def __init__(self, model, poly, scaler, label_encoders, compiler=None, fill_values=None):
+        self.model = model
+        self.poly = poly
+        self.scaler = scaler
+        self.compiler = compiler
+        self.label_encoders = label_encoders
+        self.lookups = build_lookup_tables(label_encoders)
+        self._columns = [(i, FORM_FIELDS[col], self.lookups.get(col))
+                         for i, col in enumerate(FEATURE_COLUMNS)]
+        # Training medians that replace unmeasured (zero) values, see pipeline.ZeroImputer.
+        self.fill_values = dict(fill_values or {})
+        self._fills = [(FEATURE_COLUMNS.index(col), float(value))
+                       for col, value in self.fill_values.items()]
+        self._local = threading.local()
+
+    def _buffer(self):
+        row = getattr(self._local, 'row', None)
+        if row is None:
+            row = self._local.row = np.empty((1, len(FEATURE_COLUMNS)), dtype=np.float64)
+        return row
+
+    def encode(self, cleaned_data, out=None):
+        """Write the encoded feature vector for one record into ``out``."""
+        if out is None:
+            out = self._buffer()
+        row = out.reshape(-1)
+        for i, field, lookup in self._columns:
+            value = cleaned_data[field]
+            if lookup is not None:
+                try:
+                    row[i] = lookup[value]
+                except KeyError:
+                    raise ValueError(f"Unknown category {value!r} for '{FEATURE_COLUMNS[i]}'.")
+            else:
+                row[i] = float(value)
+        for i, value in self._fills:
+            if row[i] == 0:
+                row[i] = value
+        return out
+
+    def transform(self, X):
+        if self.compiler is not None:
+            return self.compiler.transform(X)
+        with warnings.catch_warnings():
+            # poly was fitted on a DataFrame; the column order is guaranteed above.
+            warnings.filterwarnings('ignore', message='X does not have valid feature names')
+            X_poly = self.poly.transform(X)
+        return self.scaler.transform(X_poly)
+
+    def encode_many(self, records):
+        X = np.empty((len(records), len(FEATURE_COLUMNS)), dtype=np.float64)
+        for i, cleaned_data in enumerate(records):
+            self.encode(cleaned_data, out=X[i])
+        return X
+
+    def predict_encoded(self, X):
+        """Model classes for already encoded rows (see ``encode``)."""
+        with metrics.stage('transform'):
+            features = self.transform(X)
+        with metrics.stage('model'):
+            predictions = self.model.predict(features)
+        return [int(p) for p in predictions]
+
+    def predict(self, cleaned_data):
+        """Return the model's class (0 or 1) for a single form submission."""
+        with metrics.stage('encode'):
+            X = self.encode(cleaned_data)
+        return self.predict_encoded(X)[0]
+
+    def predict_many(self, records):
+        """Score a list of cleaned_data dicts with a single model.predict call."""
+        if not records:
+            return []
+        with metrics.stage('encode'):
+            X = self.encode_many(records)
+        return self.predict_encoded(X)
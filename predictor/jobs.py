@@ -0,0 +1,132 @@
+import logging
+import os
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+# A running job whose worker hasn't finished it within this long is assumed
+# lost (the process died) and handed to another worker.
+LEASE = timedelta(minutes=5)
+MAX_BACKOFF = 300
+
+
+def task(name):
+    """Register a function as a job task; it receives the job payload as keyword arguments."""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, delay=0, max_attempts=5, **payload):
+    if name not in TASKS:
+        raise ValueError(f"Unknown task '{name}'.")
+    return Job.objects.create(task=name, payload=payload, max_attempts=max_attempts,
+                              run_at=timezone.now() + timedelta(seconds=delay))
+
+
+def claim(limit=10):
+    """Mark up to ``limit`` due jobs as running and return them.
+
+    Each job is claimed with a conditional UPDATE on the state it was read in,
+    so two workers reading the same candidate can't both win it. This works
+    without SELECT ... FOR UPDATE, which SQLite doesn't have.
+    """
+    now = timezone.now()
+    due = (Job.objects
+           .filter(Q(status=Job.PENDING, run_at__lte=now) |
+                   Q(status=Job.RUNNING, started_at__lt=now - LEASE))
+           .order_by('run_at', 'id')
+           .values_list('id', 'status', 'attempts')[:limit])
+    claimed = []
+    for job_id, status, attempts in due:
+        won = (Job.objects.filter(id=job_id, status=status, attempts=attempts)
+               .update(status=Job.RUNNING, attempts=attempts + 1, started_at=now))
+        if won:
+            claimed.append(job_id)
+    return list(Job.objects.filter(id__in=claimed).order_by('run_at', 'id'))
+
+
+def run_job(job):
+    """Run one claimed job; its side effects and the DONE mark commit together."""
+    try:
+        with transaction.atomic():
+            # Writing first takes SQLite's write lock up front, so concurrent
+            # workers wait on the busy timeout instead of failing with
+            # "database is locked" when upgrading from a read.
+            Job.objects.filter(id=job.id).update(status=Job.DONE, last_error='')
+            TASKS[job.task](**job.payload)
+            Job.objects.filter(id=job.id).update(finished_at=timezone.now())
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            logger.error("Job %s failed after %s attempts.\n%s", job, job.attempts, error)
+            Job.objects.filter(id=job.id).update(status=Job.FAILED, finished_at=timezone.now(),
+                                                 last_error=error)
+        else:
+            delay = min(2 ** job.attempts, MAX_BACKOFF)
+            logger.warning("Job %s failed, retrying in %ss.\n%s", job, delay, error)
+            Job.objects.filter(id=job.id).update(
+                status=Job.PENDING, run_at=timezone.now() + timedelta(seconds=delay),
+                last_error=error)
+        return False
+    return True
+
+
+def work(once=False, batch_size=10, poll_interval=1.0):
+    """Claim and run jobs until stopped; with ``once``, until none are due."""
+    logger.info("Job worker %s started.", os.getpid())
+    while True:
+        jobs = claim(batch_size)
+        for job in jobs:
+            run_job(job)
+        if not jobs:
+            if once:
+                return
+            time.sleep(poll_interval)
+
+
+def purge(older_than=timedelta(days=7)):
+    """Delete finished jobs older than ``older_than``; failed ones are kept for inspection."""
+    deleted, _ = Job.objects.filter(status=Job.DONE,
+                                    finished_at__lt=timezone.now() - older_than).delete()
+    return deleted
+
+
+def stats(sample=100):
+    """Queue depth and latency.
+
+    ``oldest_pending`` is how long the oldest due job has been waiting and
+    ``wait``/``run`` are averages over the last ``sample`` finished jobs, all
+    in seconds.
+    """
+    now = timezone.now()
+    counts = dict.fromkeys((Job.PENDING, Job.RUNNING, Job.DONE, Job.FAILED), 0)
+    counts.update(Job.objects.values('status').annotate(count=Count('id'))
+                  .values_list('status', 'count'))
+    oldest = (Job.objects.filter(status=Job.PENDING, run_at__lte=now)
+              .aggregate(oldest=Min('run_at'))['oldest'])
+    recent = list(Job.objects.filter(status=Job.DONE).order_by('-finished_at')
+                  .values_list('run_at', 'started_at', 'finished_at')[:sample])
+    return {
+        **counts,
+        'oldest_pending': (now - oldest).total_seconds() if oldest else 0.0,
+        'wait': _mean((started - run_at).total_seconds() for run_at, started, _ in recent),
+        'run': _mean((finished - started).total_seconds() for _, started, finished in recent),
+    }
+
+
+def _mean(values):
+    values = list(values)
+    return sum(values) / len(values) if values else 0.0
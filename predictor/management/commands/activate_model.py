@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from predictor.model_registry import (ModelBundle, activate_version, list_versions,
+                                      read_active_version)
+
+
+class Command(BaseCommand):
+    help = "List the trained model versions or activate one of them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('version', nargs='?', help="Version to activate.")
+
+    def handle(self, *args, **options):
+        version = options['version']
+        if version is None:
+            active = read_active_version()
+            for name in list_versions():
+                marker = '*' if name == active else ' '
+                self.stdout.write(f"{marker} {name}")
+            return
+
+        if version not in list_versions():
+            raise CommandError(f"Unknown model version '{version}'.")
+        try:
+            # Make sure the bundle loads before any worker tries to switch to it.
+            bundle = ModelBundle(version)
+        except Exception as exc:
+            raise CommandError(f"Model version '{version}' could not be loaded: {exc}")
+        activate_version(version)
+        self.stdout.write(self.style.SUCCESS(
+            f"Activated model version '{version}' (accuracy {bundle.accuracy:.2f}%)."))
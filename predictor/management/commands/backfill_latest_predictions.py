@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from predictor.utils import refresh_latest_predictions
+
+
+class Command(BaseCommand):
+    help = "Recompute every patient's latest-prediction snapshot from the Prediction table."
+
+    def handle(self, *args, **options):
+        updated = refresh_latest_predictions()
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} patients."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from predictor import stats
+
+
+class Command(BaseCommand):
+    help = "Add predictions created since the last run to the daily statistics rollup."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Recount every prediction instead of only the new ones.")
+        parser.add_argument('--batch-size', type=int, default=100_000,
+                            help="Predictions per transaction (default 100000).")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            added = stats.rebuild()
+        else:
+            added = stats.refresh(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Counted {added} predictions."))
@@ -0,0 +1,50 @@
+import multiprocessing
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from predictor import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (deferred prediction saves, recommendation suggestions)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Worker processes to run (default 1).")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit when no job is due instead of polling.")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to sleep when the queue is empty (default 1).")
+        parser.add_argument('--stats', action='store_true',
+                            help="Print queue depth and latency and exit.")
+        parser.add_argument('--purge', type=int, metavar='DAYS',
+                            help="Delete done jobs finished more than DAYS days ago and exit.")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            for name, value in jobs.stats().items():
+                self.stdout.write(f"{name}: {value:g}")
+            return
+        if options['purge'] is not None:
+            deleted = jobs.purge(timedelta(days=options['purge']))
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} jobs."))
+            return
+
+        kwargs = {'once': options['once'], 'poll_interval': options['poll_interval']}
+        if options['workers'] == 1:
+            jobs.work(**kwargs)
+            return
+        # Children must open their own database connections.
+        connections.close_all()
+        workers = [multiprocessing.Process(target=jobs.work, kwargs=kwargs, name=f'jobs-{i}')
+                   for i in range(options['workers'])]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
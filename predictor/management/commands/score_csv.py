@@ -0,0 +1,153 @@
+import collections
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from predictor.inference import FORM_FIELDS
+from predictor.model_registry import ModelBundle, read_active_version
+from predictor.models import Patient
+from predictor.scoring import init_worker, score_chunk, score_frame
+from predictor.utils import build_prediction, risk_label, save_predictions
+
+
+class Command(BaseCommand):
+    help = ("Score a CSV of patient records (heart.csv columns) in chunks and write "
+            "the results to CSV/Parquet and/or the Prediction table.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="CSV file with heart.csv columns.")
+        parser.add_argument('--output', help="Output file; .parquet needs pyarrow, anything else is CSV.")
+        parser.add_argument('--save', action='store_true',
+                            help="Bulk-insert Prediction rows for the patient in --patient-column.")
+        parser.add_argument('--patient-column', default='patient_id')
+        parser.add_argument('--chunk-size', type=int, default=10000)
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Score chunks in this many processes (default: in-process).")
+        parser.add_argument('--model-version', help="Model version (default: the active one).")
+
+    def handle(self, *args, **options):
+        if not options['output'] and not options['save']:
+            raise CommandError("Nothing to do: pass --output and/or --save.")
+        if not os.path.exists(options['input']):
+            raise CommandError(f"No such file: {options['input']}")
+
+        version = options['model_version'] or read_active_version()
+        self.patient_column = options['patient_column']
+        self.writer = self._writer(options['output']) if options['output'] else None
+        self.save = options['save']
+        self.saved = self.skipped = 0
+
+        chunks = pd.read_csv(options['input'], chunksize=options['chunk_size'])
+        start = time.perf_counter()
+        rows = 0
+        try:
+            for chunk, predictions in self._score(chunks, version, options['workers']):
+                self._handle_results(chunk, predictions, version)
+                rows += len(chunk)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"{rows} rows scored")
+        except ValueError as exc:
+            raise CommandError(f"Could not score row {rows + 1} onwards: {exc}")
+        finally:
+            if self.writer is not None:
+                self.writer.close()
+
+        elapsed = time.perf_counter() - start
+        rate = rows / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"Scored {rows} rows with model '{version}' in {elapsed:.2f}s ({rate:.0f} rows/s)."))
+        if self.save:
+            self.stdout.write(f"Saved {self.saved} predictions, skipped {self.skipped} rows "
+                              f"without a known patient.")
+
+    def _score(self, chunks, version, workers):
+        chunks = (chunk.rename(columns={'Sex': 'Gender'}) for chunk in chunks)
+        if workers <= 1:
+            bundle = ModelBundle(version)
+            for chunk in chunks:
+                yield chunk, score_frame(bundle, chunk)
+            return
+
+        # Keep at most two chunks per worker in flight so memory stays flat.
+        connections.close_all()
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(version,)) as pool:
+            pending = collections.deque()
+            for chunk in chunks:
+                pending.append((chunk, pool.submit(score_chunk, chunk)))
+                if len(pending) >= 2 * workers:
+                    chunk, future = pending.popleft()
+                    yield chunk, future.result()
+            while pending:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+
+    def _handle_results(self, chunk, predictions, version):
+        if self.writer is not None:
+            out = chunk.copy()
+            out['prediction'] = predictions
+            out['heart_disease_risk'] = [risk_label(p) for p in predictions]
+            out['model_version'] = version
+            self.writer.write(out)
+        if self.save:
+            self._save(chunk, predictions, version)
+
+    def _save(self, chunk, predictions, version):
+        if self.patient_column not in chunk.columns:
+            raise CommandError(f"--save needs a '{self.patient_column}' column.")
+        ids = pd.to_numeric(chunk[self.patient_column], errors='coerce')
+        patients = Patient.objects.in_bulk([int(i) for i in ids.dropna().unique()])
+        records = chunk.rename(columns={col: field for col, field in FORM_FIELDS.items()})
+        objs = []
+        for patient_id, data, prediction in zip(ids, records.to_dict('records'), predictions):
+            patient = patients.get(int(patient_id)) if pd.notna(patient_id) else None
+            if patient is None:
+                self.skipped += 1
+                continue
+            objs.append(build_prediction(patient, data, int(prediction), model_version=version))
+        save_predictions(objs)
+        self.saved += len(objs)
+
+    def _writer(self, path):
+        if path.endswith('.parquet'):
+            return ParquetWriter(path)
+        return CsvWriter(path)
+
+
+class CsvWriter:
+    def __init__(self, path):
+        self.path = path
+        self.header = True
+
+    def write(self, df):
+        df.to_csv(self.path, mode='w' if self.header else 'a', header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        pass
+
+
+class ParquetWriter:
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise CommandError("Writing Parquet needs pyarrow (pip install pyarrow).")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.writer = None
+
+    def write(self, df):
+        table = self.pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
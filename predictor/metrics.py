@@ -0,0 +1,217 @@
+"""In-process latency and query metrics, rendered in the Prometheus text format.
+
+Metrics live in the memory of each server process, like the prediction
+cache, so a scraper sees the process that answered its request. Turning
+them off (PREDICTOR_METRICS = False) makes every timer a shared no-op
+context manager and removes the query-counting middleware altogether.
+
+This module doesn't import Django, so the inference code can use it in
+train_model.py and the benchmarks too.
+"""
+import bisect
+import contextlib
+import threading
+import time
+
+
+enabled = True
+
+# Seconds; prediction stages are tens of microseconds, page loads tens of milliseconds.
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+QUANTILES = (0.5, 0.95, 0.99)
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by label values.
+
+    p50/p95/p99 are estimated from the buckets the same way Prometheus'
+    histogram_quantile() does, see ``quantile``.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # One count per bucket plus +Inf, then the sum.
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labels):
+        """Context manager observing the seconds its block took."""
+        if not enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def quantile(self, q, *labels):
+        """Estimate the q-quantile, interpolating linearly inside its bucket."""
+        series = self._series.get(labels)
+        if not series:
+            return None
+        counts = series[:-1]
+        rank = q * sum(counts)
+        seen = 0
+        for i, count in enumerate(counts):
+            if count and seen + count >= rank:
+                if i == len(self.buckets):  # +Inf: the best answer is the top bound
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def samples(self):
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                yield '_bucket', labels + (_format_value(bound),), ('le',), cumulative
+            yield '_sum', labels, (), values[-1]
+            yield '_count', labels, (), cumulative
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    """Monotonic count, optionally split by label values."""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def count(self, *labels):
+        return self._series.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            series = dict(self._series)
+        for labels, value in sorted(series.items()):
+            yield '', labels, (), value
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+STAGE_SECONDS = Histogram(
+    'predictor_stage_seconds', "Time spent in each step of scoring a heart() submission.",
+    ('stage',))
+VIEW_SECONDS = Histogram(
+    'predictor_view_seconds', "Request time per view.", ('view',))
+VIEW_DB_QUERIES = Histogram(
+    'predictor_view_db_queries', "Database queries per request, per view.", ('view',),
+    buckets=QUERY_BUCKETS)
+VIEW_DB_SECONDS = Histogram(
+    'predictor_view_db_seconds', "Time per request spent in database queries, per view.",
+    ('view',))
+MODEL_LOAD_SECONDS = Histogram(
+    'predictor_model_load_seconds', "Time to load a model version, per part.",
+    ('version', 'part'))
+
+PREDICTION_CACHE_LOOKUPS = Counter(
+    'predictor_prediction_cache_lookups_total', "Prediction cache lookups by result (hit or miss).",
+    ('result',))
+
+REGISTRY = [STAGE_SECONDS, VIEW_SECONDS, VIEW_DB_QUERIES, VIEW_DB_SECONDS, MODEL_LOAD_SECONDS,
+            PREDICTION_CACHE_LOOKUPS]
+
+
+def stage(name):
+    """Time a block as one scoring stage: ``with metrics.stage('encode'): ...``."""
+    if not enabled:
+        return _NULL_TIMER
+    return _Timer(STAGE_SECONDS, (name,))
+
+
+def render():
+    """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for suffix, labels, extra, value in metric.samples():
+            names = metric.labelnames + extra
+            label_text = ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, labels))
+            label_text = '{' + label_text + '}' if label_text else ''
+            lines.append(f'{metric.name}{suffix}{label_text} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def summary():
+    """Count of every series, plus estimated p50/p95/p99 for histograms, for reading
+    without Prometheus."""
+    out = {}
+    for metric in REGISTRY:
+        rows = out[metric.name] = []
+        with metric._lock:
+            series = sorted(metric._series)
+        for labels in series:
+            row = dict(zip(metric.labelnames, labels))
+            row['count'] = metric.count(*labels)
+            if metric.type != 'histogram':
+                rows.append(row)
+                continue
+            row.update((f'p{round(q * 100)}', metric.quantile(q, *labels)) for q in QUANTILES)
+            rows.append(row)
+    return out
+
+
+def reset():
+    for metric in REGISTRY:
+        metric.reset()
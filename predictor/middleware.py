@@ -0,0 +1,103 @@
+import cProfile
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.urls import Resolver404, resolve
+
+from . import metrics, profiling
+from .models import RequestProfile
+
+
+class QueryMetricsMiddleware:
+    """Records request time, database query count and query time per view.
+
+    Queries are counted with a connection execute wrapper for the duration of
+    the request. With PREDICTOR_METRICS off Django drops the middleware at
+    startup, so it costs nothing.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PREDICTOR_METRICS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = _QueryTimer()
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else '<unresolved>'
+        metrics.VIEW_SECONDS.observe(elapsed, view)
+        metrics.VIEW_DB_QUERIES.observe(queries.count, view)
+        metrics.VIEW_DB_SECONDS.observe(queries.seconds, view)
+        return response
+
+
+class ProfilingMiddleware:
+    """Runs some requests under cProfile and keeps the result (see predictor.profiling).
+
+    A PREDICTOR_PROFILE_SAMPLE_RATE fraction of requests to SAMPLED_VIEWS is
+    profiled, and so is any request from a staff user that carries their
+    token as ``?_profile=`` or an X-Profile-Token header; those responses get
+    an X-Profile-Id header. Needs to come after AuthenticationMiddleware.
+    Off unless PREDICTOR_PROFILING is set.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PREDICTOR_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PREDICTOR_PROFILE_SAMPLE_RATE', 0.0)
+
+    def _trigger(self, request):
+        token = request.GET.get('_profile') or request.META.get('HTTP_X_PROFILE_TOKEN')
+        if token:
+            return RequestProfile.REQUESTED if profiling.token_is_valid(token, request.user) else None
+        if self.sample_rate and random.random() < self.sample_rate:
+            try:
+                match = resolve(request.path_info)
+            except Resolver404:
+                return None
+            if match.view_name in profiling.SAMPLED_VIEWS:
+                return RequestProfile.SAMPLED
+        return None
+
+    def __call__(self, request):
+        trigger = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        queries = _QueryTimer()
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+        profile = profiling.save_profile(profiler, request, response, duration, queries, trigger)
+        if trigger == RequestProfile.REQUESTED:
+            response['X-Profile-Id'] = str(profile.id)
+        return response
+
+
+class _QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
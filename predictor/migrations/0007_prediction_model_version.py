@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictor', '0006_rename_sex_prediction_gender'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prediction',
+            name='model_version',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+    ]
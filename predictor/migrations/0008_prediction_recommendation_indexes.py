@@ -0,0 +1,26 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("predictor", "0007_prediction_model_version"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="prediction",
+            index=models.Index(
+                fields=["patient", "-prediction_date"],
+                name="prediction_patient_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recommendation",
+            index=models.Index(
+                fields=["patient", "-created_at"], name="recommendation_patient_idx"
+            ),
+        ),
+    ]
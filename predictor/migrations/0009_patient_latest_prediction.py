@@ -0,0 +1,51 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_latest_predictions(apps, schema_editor):
+    # Same UPDATE as utils.refresh_latest_predictions, against the historical
+    # models, so patients who already have predictions keep their history.
+    Patient = apps.get_model("predictor", "Patient")
+    Prediction = apps.get_model("predictor", "Prediction")
+    latest = Prediction.objects.filter(patient=OuterRef("pk")).order_by("-prediction_date", "-id")
+    Patient.objects.update(
+        latest_prediction=Subquery(latest.values("id")[:1]),
+        latest_risk=Coalesce(Subquery(latest.values("heart_disease_risk")[:1]), Value("")),
+        latest_prediction_date=Subquery(latest.values("prediction_date")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("predictor", "0008_prediction_recommendation_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="patient",
+            name="latest_prediction",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="predictor.prediction",
+            ),
+        ),
+        migrations.AddField(
+            model_name="patient",
+            name="latest_prediction_date",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="patient",
+            name="latest_risk",
+            field=models.CharField(blank=True, default="", max_length=20),
+        ),
+        migrations.RunPython(fill_latest_predictions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("predictor", "0010_job_prediction_suggested_recommendations"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyPredictionStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("gender", models.CharField(max_length=1)),
+                (
+                    "age_band",
+                    models.PositiveSmallIntegerField(
+                        help_text="Lower bound of the 10-year age band."
+                    ),
+                ),
+                ("chest_pain_type", models.CharField(max_length=3)),
+                ("predictions", models.PositiveIntegerField(default=0)),
+                ("high_risk", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name_plural": "daily prediction stats",
+            },
+        ),
+        migrations.CreateModel(
+            name="StatsWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("last_prediction_id", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="dailypredictionstats",
+            constraint=models.UniqueConstraint(
+                fields=("date", "gender", "age_band", "chest_pain_type"),
+                name="daily_stats_group_unique",
+            ),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("predictor", "0011_daily_prediction_stats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestProfile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("method", models.CharField(max_length=10)),
+                ("url", models.CharField(max_length=2000)),
+                ("view_name", models.CharField(blank=True, max_length=200)),
+                (
+                    "user_type",
+                    models.CharField(
+                        blank=True,
+                        help_text="doctor or patient; empty for anonymous requests.",
+                        max_length=10,
+                    ),
+                ),
+                ("status_code", models.PositiveSmallIntegerField()),
+                (
+                    "duration",
+                    models.FloatField(help_text="Seconds, profiler overhead included."),
+                ),
+                ("query_count", models.PositiveIntegerField()),
+                (
+                    "query_time",
+                    models.FloatField(help_text="Seconds spent in database queries."),
+                ),
+                (
+                    "trigger",
+                    models.CharField(
+                        choices=[
+                            ("sampled", "Sampled"),
+                            ("requested", "Requested by staff"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "stats_file",
+                    models.CharField(
+                        help_text="pstats dump in PREDICTOR_PROFILE_DIR.",
+                        max_length=255,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["view_name", "-duration"],
+                        name="profile_view_duration_idx",
+                    )
+                ],
+            },
+        ),
+    ]
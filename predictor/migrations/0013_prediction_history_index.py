@@ -0,0 +1,24 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("predictor", "0012_request_profile"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="prediction",
+            name="prediction_patient_date_idx",
+        ),
+        migrations.AddIndex(
+            model_name="prediction",
+            index=models.Index(
+                fields=["patient", "-prediction_date", "-id"],
+                name="prediction_patient_date_id_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,214 @@
+import json
+import logging
+import os
+import threading
+import time
+from functools import cached_property
+
+import joblib
+
+from . import metrics
+from .forest import FlatForest
+from .inference import FEATURE_COLUMNS, FeatureCompiler, InferenceEngine
+from .pipeline import (LEGACY_FILL_VALUES, HeartFeatureEncoder, pipeline_from_pickles,
+                       predict_frame)
+
+
+logger = logging.getLogger(__name__)
+
+MODELS_PATH = os.path.join(os.path.dirname(__file__), 'trained_models')
+VERSIONS_DIR = 'versions'
+ACTIVE_FILE = 'ACTIVE'
+
+
+def version_path(version, path=MODELS_PATH):
+    return os.path.join(path, VERSIONS_DIR, version)
+
+
+def list_versions(path=MODELS_PATH):
+    versions_dir = os.path.join(path, VERSIONS_DIR)
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted(name for name in os.listdir(versions_dir)
+                  if os.path.isdir(os.path.join(versions_dir, name)))
+
+
+def read_active_version(path=MODELS_PATH):
+    with open(os.path.join(path, ACTIVE_FILE), 'r') as f:
+        return f.read().strip()
+
+
+def activate_version(version, path=MODELS_PATH):
+    """Point ACTIVE at ``version``. Running workers pick it up on their next check."""
+    if version not in list_versions(path):
+        raise ValueError(f"Unknown model version '{version}'.")
+    active = os.path.join(path, ACTIVE_FILE)
+    tmp = f'{active}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp, active)
+
+
+class ModelBundle:
+    """One versioned set of artifacts: the pipeline, its fast-path forms, accuracy and schema."""
+
+    def __init__(self, version, path=MODELS_PATH):
+        start = time.perf_counter()
+        self.version = version
+        self.path = version_path(version, path)
+
+        schema_path = self._file('schema.json')
+        self.schema = {}
+        if os.path.exists(schema_path):
+            with open(schema_path, 'r') as f:
+                self.schema = json.load(f)
+        features = self.schema.get('features', FEATURE_COLUMNS)
+        if features != FEATURE_COLUMNS:
+            raise ValueError(f"Model version '{version}' expects features {features}.")
+
+        # forest/ and feature_compiler.npz are faster forms of the pipeline's
+        # model and poly/scaler steps for scoring a few rows at a time. With
+        # both present (and the categories in the schema) the pipeline itself
+        # is only unpickled once a whole frame is scored.
+        forest_path = self._file('forest')
+        compiler_path = self._file('feature_compiler.npz')
+        if (os.path.isdir(forest_path) and os.path.exists(compiler_path)
+                and 'categories' in self.schema and 'imputation' in self.schema):
+            encoder = HeartFeatureEncoder(self.schema['categories']).fit()
+            self.engine = InferenceEngine(FlatForest.load(forest_path), None, None,
+                                          encoder.label_encoders(),
+                                          compiler=FeatureCompiler.load(compiler_path),
+                                          fill_values=self.schema['imputation'])
+        else:
+            steps = self.pipeline.named_steps
+            model = FlatForest.load(forest_path) if os.path.isdir(forest_path) else steps['model']
+            compiler = FeatureCompiler.load(compiler_path) if os.path.exists(compiler_path) else None
+            self.engine = InferenceEngine(model, steps['poly'], steps['scaler'],
+                                          steps['encode'].label_encoders(), compiler=compiler,
+                                          fill_values=steps['impute'].fill_values_)
+
+        with open(self._file('model_accuracy.txt'), 'r') as f:
+            self.accuracy = float(f.read().strip())
+        if metrics.enabled:
+            metrics.MODEL_LOAD_SECONDS.observe(time.perf_counter() - start, version, 'bundle')
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @cached_property
+    def pipeline(self):
+        with metrics.MODEL_LOAD_SECONDS.time(self.version, 'pipeline'):
+            return self._load_pipeline()
+
+    def _load_pipeline(self):
+        pipeline_path = self._file('pipeline.pkl')
+        if os.path.exists(pipeline_path):
+            return joblib.load(pipeline_path, mmap_mode='r')
+        # Bundles saved before pipeline.pkl existed.
+        return pipeline_from_pickles(
+            joblib.load(self._file('poly.pkl')), joblib.load(self._file('scaler.pkl')),
+            joblib.load(self._file('model.pkl'), mmap_mode='r'),
+            joblib.load(self._file('label_encoders.pkl')),
+            self.schema.get('imputation', LEGACY_FILL_VALUES))
+
+    def predict(self, cleaned_data):
+        return self.engine.predict(cleaned_data)
+
+    def predict_many(self, records):
+        return self.engine.predict_many(records)
+
+    def predict_frame(self, df):
+        """Model classes for a DataFrame with the heart.csv feature columns, in one pipeline call."""
+        pipeline = self.pipeline
+        with metrics.stage('pipeline'):
+            return predict_frame(pipeline, df)
+
+
+class ModelRegistry:
+    """Serves the active ModelBundle, loading it on first use.
+
+    At most every ``check_interval`` seconds a request stats the ACTIVE file.
+    When it names another version, that bundle is loaded on a background
+    thread while the current one keeps serving, and then swapped in with a
+    single attribute assignment. Callers take a reference from ``current()``
+    once per request, so in-flight requests finish on the bundle they started
+    with.
+    """
+
+    def __init__(self, path=MODELS_PATH, check_interval=None):
+        self.path = path
+        if check_interval is None:
+            from django.conf import settings
+            check_interval = getattr(settings, 'PREDICTOR_MODEL_CHECK_INTERVAL', 5.0)
+        self.check_interval = check_interval
+        self._bundle = None
+        self._lock = threading.Lock()
+        self._loading = None
+        self._active_mtime = None
+        self._next_check = 0.0
+
+    def _active_stat(self):
+        return os.stat(os.path.join(self.path, ACTIVE_FILE)).st_mtime_ns
+
+    def _load_active(self):
+        self._active_mtime = self._active_stat()
+        self._bundle = ModelBundle(read_active_version(self.path), self.path)
+        self._next_check = time.monotonic() + self.check_interval
+        return self._bundle
+
+    def reload(self):
+        """Load the active version synchronously and swap it in."""
+        with self._lock:
+            return self._load_active()
+
+    def _load_in_background(self, version):
+        try:
+            bundle = ModelBundle(version, self.path)
+        except Exception:
+            logger.exception("Could not load model version '%s'; keeping '%s'.",
+                             version, self._bundle.version)
+        else:
+            self._bundle = bundle
+            logger.info("Switched to model version '%s'.", version)
+        finally:
+            self._loading = None
+
+    def _check_for_swap(self):
+        with self._lock:
+            mtime = self._active_stat()
+            if mtime == self._active_mtime or self._loading is not None:
+                return
+            self._active_mtime = mtime
+            version = read_active_version(self.path)
+            if version == self._bundle.version:
+                return
+            self._loading = threading.Thread(target=self._load_in_background, args=(version,),
+                                             name='predictor-model-swap', daemon=True)
+            self._loading.start()
+
+    def current(self):
+        bundle = self._bundle
+        if bundle is None:
+            with self._lock:
+                return self._bundle if self._bundle is not None else self._load_active()
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            try:
+                self._check_for_swap()
+            except OSError:
+                logger.exception("Could not read the active model version.")
+        return bundle
+
+    @property
+    def accuracy(self):
+        return self.current().accuracy
+
+    def predict(self, cleaned_data):
+        return self.current().predict(cleaned_data)
+
+    def predict_many(self, records):
+        return self.current().predict_many(records)
+
+
+registry = ModelRegistry()
@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
 class CustomUser(AbstractUser):
     USER_TYPE_CHOICES = (
@@ -12,6 +14,11 @@ class Patient(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
     date_of_birth = models.DateField()
     doctor = models.ForeignKey('Doctor', on_delete=models.SET_NULL, null=True, blank=True)
+    # Snapshot of the newest prediction, kept up to date by utils.save_predictions.
+    latest_prediction = models.ForeignKey('Prediction', on_delete=models.SET_NULL, null=True,
+                                          blank=True, related_name='+')
+    latest_risk = models.CharField(max_length=20, blank=True, default='')
+    latest_prediction_date = models.DateTimeField(null=True, blank=True)
 
 class Doctor(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='doctor')
@@ -43,6 +50,17 @@ class Prediction(models.Model):
                                                        ('Down', 'Downsloping')])
     heart_disease_risk = models.CharField(max_length=20)  
     prediction_date = models.DateTimeField(auto_now_add=True)
+    model_version = models.CharField(max_length=50, blank=True, default='')
+    # get_recommendations() output, filled in by the suggest_recommendations job.
+    suggested_recommendations = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        indexes = [
+            # A patient's history in PREDICTION_ORDERING, newest first (profile,
+            # patient_detail); id breaks ties so keyset pages need no sort.
+            models.Index(fields=['patient', '-prediction_date', '-id'],
+                         name='prediction_patient_date_id_idx'),
+        ]
 
 class Recommendation(models.Model):
     content = models.TextField()
@@ -53,4 +71,90 @@ class Recommendation(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['patient', '-created_at'], name='recommendation_patient_idx'),
+        ]
+
+
+class Job(models.Model):
+    """A unit of deferred work, run by `manage.py run_jobs` (see predictor.jobs)."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # Workers look for the next due job.
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.task} #{self.id} ({self.status})'
+
+
+class DailyPredictionStats(models.Model):
+    """Predictions per day and patient group, maintained by `manage.py refresh_stats`."""
+    date = models.DateField()
+    gender = models.CharField(max_length=1)
+    age_band = models.PositiveSmallIntegerField(help_text="Lower bound of the 10-year age band.")
+    chest_pain_type = models.CharField(max_length=3)
+    predictions = models.PositiveIntegerField(default=0)
+    high_risk = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily prediction stats'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'gender', 'age_band', 'chest_pain_type'],
+                                    name='daily_stats_group_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} {self.gender} {self.age_band}+ {self.chest_pain_type}'
+
+
+class StatsWatermark(models.Model):
+    """Highest Prediction id already counted into a rollup."""
+    name = models.CharField(max_length=50, unique=True)
+    last_prediction_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class RequestProfile(models.Model):
+    """A request run under cProfile by ProfilingMiddleware (see predictor.profiling)."""
+    SAMPLED = 'sampled'
+    REQUESTED = 'requested'
+    TRIGGER_CHOICES = [(SAMPLED, 'Sampled'), (REQUESTED, 'Requested by staff')]
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    method = models.CharField(max_length=10)
+    url = models.CharField(max_length=2000)
+    view_name = models.CharField(max_length=200, blank=True)
+    user_type = models.CharField(max_length=10, blank=True,
+                                 help_text="doctor or patient; empty for anonymous requests.")
+    status_code = models.PositiveSmallIntegerField()
+    duration = models.FloatField(help_text="Seconds, profiler overhead included.")
+    query_count = models.PositiveIntegerField()
+    query_time = models.FloatField(help_text="Seconds spent in database queries.")
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    stats_file = models.CharField(max_length=255, help_text="pstats dump in PREDICTOR_PROFILE_DIR.")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['view_name', '-duration'], name='profile_view_duration_idx'),
+        ]
 
+    def __str__(self):
+        return f'{self.method} {self.url} ({self.duration * 1000:.0f} ms)'
@@ -0,0 +1,104 @@
+import base64
+import json
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _field(model, path):
+    field = None
+    for name in path.split('__'):
+        field = model._meta.get_field(name)
+        model = field.related_model
+    return field
+
+
+def _value(obj, path):
+    for name in path.split('__'):
+        obj = getattr(obj, name)
+    return obj
+
+
+def encode_cursor(values):
+    data = [v.isoformat() if hasattr(v, 'isoformat') else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+
+
+def decode_cursor(model, ordering, cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(data, list) or len(data) != len(ordering):
+            raise ValueError
+        return [_field(model, f.lstrip('-')).to_python(v) for f, v in zip(ordering, data)]
+    except Exception:
+        raise InvalidCursor("Invalid cursor.")
+
+
+def cursor_for(obj, ordering):
+    return encode_cursor([_value(obj, f.lstrip('-')) for f in ordering])
+
+
+def after(ordering, values):
+    """Q selecting the rows that come after ``values`` in ``ordering``.
+
+    ``ordering`` must end in a unique field (usually ``id``) so the position
+    is unambiguous; descending fields are prefixed with '-' as in order_by.
+    The OR of the tie-breaking clauses is ANDed with a plain range on the
+    first field (``prediction_date <= X``), which adds nothing logically but
+    lets the database seek an index on that field instead of scanning and
+    filtering everything before the cursor.
+    """
+    clauses = []
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        equal = {f.lstrip('-'): v for f, v in zip(ordering[:i], values[:i])}
+        clauses.append(Q(**equal, **{f'{name}__{lookup}': values[i]}))
+    condition = reduce(or_, clauses)
+    if len(ordering) > 1:
+        first = ordering[0]
+        lookup = 'lte' if first.startswith('-') else 'gte'
+        condition = Q(**{f'{first.lstrip("-")}__{lookup}': values[0]}) & condition
+    return condition
+
+
+def keyset_queryset(queryset, ordering, cursor=None, page_size=20):
+    """The query keyset_paginate runs: ``page_size + 1`` rows after ``cursor``."""
+    if cursor:
+        queryset = queryset.filter(after(ordering, decode_cursor(queryset.model, ordering, cursor)))
+    return queryset.order_by(*ordering)[:page_size + 1]
+
+
+def keyset_paginate(queryset, ordering, cursor=None, page_size=20):
+    """One page of ``queryset`` in ``ordering``, starting after ``cursor``.
+
+    Unlike OFFSET pagination this costs the same on every page, provided an
+    index matches the queryset's filter followed by ``ordering`` (e.g.
+    (patient, -prediction_date, -id) for a patient's history): the cursor
+    becomes a range the index seeks to, and the rows come out already sorted.
+    """
+    items = list(keyset_queryset(queryset, ordering, cursor, page_size))
+    next_cursor = cursor_for(items[page_size - 1], ordering) if len(items) > page_size else None
+    return KeysetPage(items[:page_size], next_cursor)
@@ -0,0 +1,135 @@
+"""The model as a single sklearn Pipeline: encode -> impute -> poly -> scaler -> model.
+
+Training fits it and saves it as ``pipeline.pkl``; serving loads it once
+and either calls it directly on a DataFrame batch or takes its fitted steps
+for the InferenceEngine fast path. Either way both sides share one
+definition of the feature layout.
+"""
+import warnings
+
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import LabelEncoder
+
+from .inference import FEATURE_COLUMNS
+
+
+# Every category the form accepts; codes are their positions once sorted, as with LabelEncoder.
+CATEGORIES = {
+    'Gender': ['M', 'F'],
+    'ChestPainType': ['TA', 'ATA', 'NAP', 'ASY'],
+    'RestingECG': ['Normal', 'ST', 'LVH'],
+    'ExerciseAngina': ['Y', 'N'],
+    'ST_Slope': ['Up', 'Flat', 'Down'],
+}
+# train_model.py used to impute with the median of heart.csv's whole Cholesterol
+# column, zeros included; bundles saved before the fill was stored used this.
+LEGACY_FILL_VALUES = {'Cholesterol': 223.0}
+
+
+class HeartFeatureEncoder(TransformerMixin, BaseEstimator):
+    """heart.csv columns -> float64 array in FEATURE_COLUMNS order, categories as codes."""
+
+    def __init__(self, categories=None):
+        self.categories = categories
+
+    def fit(self, X=None, y=None):
+        categories = CATEGORIES if self.categories is None else self.categories
+        self.classes_ = {col: np.array(sorted(values)) for col, values in categories.items()}
+        return self
+
+    def transform(self, X):
+        missing = [col for col in FEATURE_COLUMNS if col not in X.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}.")
+        out = np.empty((len(X), len(FEATURE_COLUMNS)), dtype=np.float64)
+        for i, col in enumerate(FEATURE_COLUMNS):
+            values = X[col].to_numpy()
+            classes = self.classes_.get(col)
+            if classes is None:
+                out[:, i] = values
+                continue
+            codes = np.searchsorted(classes, values)
+            unknown = (codes >= len(classes)) | (classes[np.minimum(codes, len(classes) - 1)] != values)
+            if unknown.any():
+                raise ValueError(f"Unknown category {values[unknown][0]!r} for '{col}'.")
+            out[:, i] = codes
+        return out
+
+    def label_encoders(self):
+        """The categories as fitted LabelEncoders, the form InferenceEngine takes them in."""
+        encoders = {}
+        for col, classes in self.classes_.items():
+            encoders[col] = le = LabelEncoder()
+            le.classes_ = classes
+        return encoders
+
+    def get_feature_names_out(self, input_features=None):
+        return np.array(FEATURE_COLUMNS, dtype=object)
+
+
+class ZeroImputer(TransformerMixin, BaseEstimator):
+    """Replaces zeros in ``columns`` (unmeasured in heart.csv) with the median of
+    the measured training values.
+
+    The medians are learned once in fit and stored as ``fill_values_``, so a
+    row imputes the same way alone or in any batch.
+    """
+
+    def __init__(self, columns=('Cholesterol',)):
+        self.columns = columns
+
+    def fit(self, X, y=None):
+        X = np.asarray(X, dtype=np.float64)
+        self.fill_values_ = {}
+        for col in self.columns:
+            values = X[:, FEATURE_COLUMNS.index(col)]
+            self.fill_values_[col] = float(np.median(values[values != 0]))
+        return self
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float64)
+        impute(X, self.fill_values_)
+        return X
+
+
+def impute(X, fill_values):
+    """Replace zeros in the FEATURE_COLUMNS-ordered rows of X in place."""
+    for col, value in fill_values.items():
+        i = FEATURE_COLUMNS.index(col)
+        X[X[:, i] == 0, i] = value
+    return X
+
+
+def fitted_imputer(fill_values):
+    imputer = ZeroImputer(columns=tuple(fill_values))
+    imputer.fill_values_ = dict(fill_values)
+    return imputer
+
+
+def build_pipeline(poly, scaler, model, encoder=None, fill_values=LEGACY_FILL_VALUES):
+    return Pipeline([
+        ('encode', encoder if encoder is not None else HeartFeatureEncoder().fit()),
+        ('impute', fitted_imputer(fill_values)),
+        ('poly', poly),
+        ('scaler', scaler),
+        ('model', model),
+    ])
+
+
+def pipeline_from_pickles(poly, scaler, model, label_encoders, fill_values=LEGACY_FILL_VALUES):
+    """Pipeline equivalent to the separate poly/scaler/model/label_encoders pickles
+    that bundles used to be saved as."""
+    encoder = HeartFeatureEncoder({col: list(le.classes_) for col, le in label_encoders.items()}).fit()
+    if hasattr(poly, 'feature_names_in_'):
+        # Fitted on a DataFrame; inside the pipeline it gets the encoder's array.
+        poly = poly.__class__(**poly.get_params()).fit(np.zeros((1, poly.n_features_in_)))
+    return build_pipeline(poly, scaler, model, encoder, fill_values)
+
+
+def predict_frame(pipeline, df):
+    with warnings.catch_warnings():
+        # The model step may have been fitted on a DataFrame too.
+        warnings.filterwarnings('ignore', message='X does not have valid feature names')
+        return pipeline.predict(df)
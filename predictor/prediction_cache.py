@@ -0,0 +1,68 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+from . import metrics
+
+
+class PredictionCache:
+    """Caches model outputs keyed on the encoded feature vector and model version.
+
+    Storage, eviction and expiry come from the Django cache named by
+    ``PREDICTOR_CACHE_ALIAS`` (MAX_ENTRIES and TIMEOUT bound it), so a
+    local-memory cache works per process and a shared backend works across
+    workers. Hits and misses are counted in the process's metrics
+    (predictor_prediction_cache_lookups_total at /metrics).
+    """
+
+    def __init__(self, alias=None):
+        self.alias = alias if alias is not None else getattr(settings, 'PREDICTOR_CACHE_ALIAS', None)
+
+    @property
+    def cache(self):
+        if not self.alias:
+            return None
+        try:
+            return caches[self.alias]
+        except InvalidCacheBackendError:
+            return None
+
+    @staticmethod
+    def key(version, row):
+        # Adding 0.0 turns -0.0 into 0.0 so equal inputs hash equally.
+        digest = hashlib.blake2b((row + 0.0).tobytes(), digest_size=16).hexdigest()
+        return f'prediction:{version}:{digest}'
+
+    @staticmethod
+    def _count(hits, misses):
+        if metrics.enabled:
+            metrics.PREDICTION_CACHE_LOOKUPS.inc(hits, 'hit')
+            metrics.PREDICTION_CACHE_LOOKUPS.inc(misses, 'miss')
+
+    def predict(self, bundle, cleaned_data):
+        return self.predict_many(bundle, [cleaned_data])[0]
+
+    def predict_many(self, bundle, records):
+        """Model outputs for ``records``; only cache misses reach the model."""
+        if not records:
+            return []
+        engine = bundle.engine
+        X = engine.encode_many(records)
+        cache = self.cache
+        if cache is None:
+            return engine.predict_encoded(X)
+
+        keys = [self.key(bundle.version, row) for row in X]
+        found = cache.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        self._count(len(keys) - len(missing), len(missing))
+        if missing:
+            fresh = engine.predict_encoded(X[missing])
+            found.update(zip((keys[i] for i in missing), fresh))
+            cache.set_many({keys[i]: found[keys[i]] for i in missing})
+        return [found[key] for key in keys]
+
+
+prediction_cache = PredictionCache()
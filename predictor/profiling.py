@@ -0,0 +1,98 @@
+"""Captured cProfile runs of single requests, taken by ProfilingMiddleware.
+
+Each capture is a pstats dump in PREDICTOR_PROFILE_DIR (open it with
+``python -m pstats``, snakeviz or flameprof for a flame graph) and a
+RequestProfile row with the URL, user type, timing and query count, which
+the admin lists slowest first.
+"""
+import io
+import os
+import pstats
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+from .models import RequestProfile
+
+
+TOKEN_SALT = 'predictor.profiling'
+# How long a staff member's profiling token stays valid, in seconds.
+TOKEN_MAX_AGE = 24 * 60 * 60
+# Views a sampled request is taken from; a staff token profiles any view.
+SAMPLED_VIEWS = ('heart', 'profile', 'patient_detail')
+
+
+def profile_directory():
+    return str(getattr(settings, 'PREDICTOR_PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles')))
+
+
+def profile_token(user):
+    """Token a staff user adds as ``?_profile=`` or an X-Profile-Token header to profile a request."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(str(user.pk))
+
+
+def token_is_valid(token, user):
+    if not (user.is_authenticated and user.is_staff):
+        return False
+    try:
+        return signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=TOKEN_MAX_AGE) == str(user.pk)
+    except signing.BadSignature:
+        return False
+
+
+def save_profile(profiler, request, response, duration, queries, trigger):
+    directory = profile_directory()
+    os.makedirs(directory, exist_ok=True)
+    name = f'{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}.prof'
+    profiler.dump_stats(os.path.join(directory, name))
+
+    match = getattr(request, 'resolver_match', None)
+    user = getattr(request, 'user', None)
+    profile = RequestProfile.objects.create(
+        method=request.method,
+        url=request.get_full_path()[:2000],
+        view_name=match.view_name if match is not None else '',
+        user_type=getattr(user, 'user_type', '') if user is not None and user.is_authenticated else '',
+        status_code=response.status_code,
+        duration=duration,
+        query_count=queries.count,
+        query_time=queries.seconds,
+        trigger=trigger,
+        stats_file=name,
+    )
+    prune(getattr(settings, 'PREDICTOR_PROFILE_KEEP', 500))
+    return profile
+
+
+def prune(keep):
+    """Delete all but the ``keep`` newest captures."""
+    old = RequestProfile.objects.order_by('-created_at', '-id').values_list('id', flat=True)[keep:]
+    delete_profiles(RequestProfile.objects.filter(id__in=list(old)))
+
+
+def delete_profiles(profiles):
+    """Delete captures along with their stats files."""
+    profiles = list(profiles)
+    RequestProfile.objects.filter(id__in=[profile.id for profile in profiles]).delete()
+    for profile in profiles:
+        try:
+            os.remove(stats_path(profile))
+        except FileNotFoundError:
+            pass
+
+
+def stats_path(profile):
+    return os.path.join(profile_directory(), os.path.basename(profile.stats_file))
+
+
+def top_functions(profile, limit=40, sort='cumulative'):
+    """The ``limit`` most expensive functions of a capture as pstats prints them."""
+    out = io.StringIO()
+    try:
+        stats = pstats.Stats(stats_path(profile), stream=out)
+    except FileNotFoundError:
+        return "The stats file is gone."
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,90 @@
+import operator
+from collections import namedtuple
+
+import numpy as np
+
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# A rule fires for predictions with the given risk when any of its
+# (field, operator, value) conditions holds, or always when it has none.
+Rule = namedtuple('Rule', ['risk', 'any_of', 'message'])
+
+RULES = [
+    Rule('have', [('cholesterol', '>', 200)],
+         "Heart-healthy diet and regular moderate-intensity exercise" "recommended."),
+    Rule('have', [('restingbp', '>', 130)],
+         "Regularly monitor your blood pressure and adopt lifestyle" "changes."),
+    Rule('have', [('fastingbs', '==', 1)],
+         "Balanced diet, regular exercise and further medical evaluation" "for diabetes recommended."),
+    Rule('have', [('exerciseangina', '==', 'Y')],
+         "Avoid strenuous activities until further evaluation is completed."),
+    Rule('have', [('chest_pain_type', '!=', 'ASY'), ('restingecg', '!=', 'Normal'),
+                  ('oldpeak', '>', 1), ('st_slope', '!=', 'Flat')],
+         "Further medical evaluation needed."),
+    Rule("don't have", [],
+         "The patient is okay with no significant risks detected."),
+]
+
+FIELDS = ['heart_disease_risk'] + sorted({field for rule in RULES for field, _, _ in rule.any_of})
+
+
+def _fires(rule, get):
+    return rule.any_of == [] or any(OPERATORS[op](get(field), value)
+                                    for field, op, value in rule.any_of)
+
+
+def recommendations_for(prediction, rules=RULES):
+    """Messages of the rules that fire for one Prediction (or any object with its fields)."""
+    risk = prediction.heart_disease_risk
+    return [rule.message for rule in rules
+            if rule.risk == risk and _fires(rule, lambda field: getattr(prediction, field))]
+
+
+def rule_mask(columns, rules=RULES):
+    """Boolean (n_predictions, n_rules) array of which rules fire.
+
+    ``columns`` maps each name in FIELDS to an array-like of equal length, e.g.
+    a DataFrame; every rule is evaluated once over the whole batch.
+    """
+    arrays = {field: np.asarray(columns[field]) for field in FIELDS}
+    n = len(arrays['heart_disease_risk'])
+    mask = np.empty((n, len(rules)), dtype=bool)
+    for j, rule in enumerate(rules):
+        fired = (np.ones(n, dtype=bool) if not rule.any_of else
+                 np.logical_or.reduce([OPERATORS[op](arrays[field], value)
+                                       for field, op, value in rule.any_of]))
+        mask[:, j] = fired & (arrays['heart_disease_risk'] == rule.risk)
+    return mask
+
+
+def recommendations_for_columns(columns, rules=RULES):
+    """recommendations_for() of every row of ``columns``, as a list of message lists.
+
+    Rows firing the same rules share one list, so treat the results as read-only.
+    """
+    mask = rule_mask(columns, rules)
+    if not len(mask):
+        return []
+    bits = mask @ (1 << np.arange(len(rules), dtype=np.int64))
+    combinations, inverse = np.unique(bits, return_inverse=True)
+    messages = [[rule.message for j, rule in enumerate(rules) if combination >> j & 1]
+                for combination in combinations.tolist()]
+    return [messages[i] for i in inverse.tolist()]
+
+
+def recommendations_for_queryset(predictions, rules=RULES):
+    """{prediction id: messages} for a Prediction queryset, without building model instances."""
+    rows = list(predictions.values_list('id', *FIELDS))
+    if not rows:
+        return {}
+    ids, *values = zip(*rows)
+    columns = dict(zip(FIELDS, values))
+    return dict(zip(ids, recommendations_for_columns(columns, rules)))
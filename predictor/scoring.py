@@ -0,0 +1,41 @@
+import numpy as np
+
+from .model_registry import ModelBundle, registry
+from .prediction_cache import prediction_cache
+
+
+def score_frame(bundle, df):
+    """Model classes for a DataFrame with the heart.csv feature columns.
+
+    The whole frame goes through the bundle's pipeline at once, with the same
+    encoding and cholesterol imputation the model was trained with.
+    """
+    return np.asarray(bundle.predict_frame(df), dtype=np.int64)
+
+
+def score_records(records):
+    """(prediction, model version) for each cleaned_data dict, via the prediction cache."""
+    bundle = registry.current()
+    return [(prediction, bundle.version)
+            for prediction in prediction_cache.predict_many(bundle, records)]
+
+
+def init_django():
+    from django.apps import apps
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+# Process pool workers load the bundle once and keep it for every chunk.
+_worker_bundle = None
+
+
+def init_worker(version):
+    global _worker_bundle
+    init_django()
+    _worker_bundle = ModelBundle(version)
+
+
+def score_chunk(df):
+    return score_frame(_worker_bundle, df)
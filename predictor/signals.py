@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import fragments
+from .dashboard import invalidate_for_predictions
+from .models import CustomUser, Patient, Prediction, Recommendation
+from .utils import refresh_latest_predictions
+
+
+@receiver(post_delete, sender=Prediction)
+def prediction_deleted(sender, instance, **kwargs):
+    # The snapshot may have pointed at the deleted row; fall back to the next newest.
+    refresh_latest_predictions(Patient.objects.filter(pk=instance.patient_id))
+    invalidate_for_predictions([instance])
+    fragments.invalidate(fragments.PREDICTION_KINDS, [instance.pk])
+
+
+@receiver(post_save, sender=Prediction)
+def prediction_saved(sender, instance, created, **kwargs):
+    if not created:
+        fragments.invalidate(fragments.PREDICTION_KINDS, [instance.pk])
+
+
+@receiver(post_save, sender=Recommendation)
+@receiver(post_delete, sender=Recommendation)
+def recommendation_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        fragments.invalidate('recommendation', [instance.pk])
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Recommendations show their doctor's name; logging in only touches last_login.
+    if created or instance.user_type != 'doctor' or update_fields == frozenset({'last_login'}):
+        return
+    fragments.invalidate('recommendation', Recommendation.objects.filter(doctor__user=instance)
+                         .values_list('id', flat=True))
@@ -0,0 +1,39 @@
+"""SQLite performance mode: PRAGMAs set on every new connection.
+
+- journal_mode=WAL lets readers run while a write is in progress instead
+  of waiting for it, and makes commits appends to the -wal file.
+- synchronous=NORMAL syncs the WAL at checkpoints rather than on every
+  commit. A power cut can lose the last commits but not corrupt the file.
+- busy_timeout makes a writer wait for the lock instead of failing with
+  "database is locked".
+- cache_size and mmap_size keep more of the file in memory.
+
+Enabled with PREDICTOR_SQLITE_PERFORMANCE (True, or a dict overriding some
+of PERFORMANCE_PRAGMAS); connection reuse is CONN_MAX_AGE in DATABASES.
+"""
+from django.conf import settings
+
+
+PERFORMANCE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,  # ms
+    'cache_size': -20000,  # negative means KiB, so about 20 MB
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+
+
+def pragmas():
+    setting = getattr(settings, 'PREDICTOR_SQLITE_PERFORMANCE', False)
+    if not setting:
+        return {}
+    return {**PERFORMANCE_PRAGMAS, **(setting if isinstance(setting, dict) else {})}
+
+
+def configure_connection(sender, connection, **kwargs):
+    """connection_created receiver applying ``pragmas()`` to SQLite connections."""
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in pragmas().items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
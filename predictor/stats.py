@@ -0,0 +1,105 @@
+from django.db import connection, transaction
+from django.db.models import Count, ExpressionWrapper, F, IntegerField, Max, Q, Sum
+from django.db.models.functions import TruncDate
+
+from .models import DailyPredictionStats, Prediction, StatsWatermark
+
+
+WATERMARK = 'daily_prediction_stats'
+GROUP_FIELDS = ['date', 'gender', 'age_band', 'chest_pain_type']
+COUNT_FIELDS = ['predictions', 'high_risk']
+COLUMNS = GROUP_FIELDS + COUNT_FIELDS
+
+
+def _aggregate(predictions):
+    """Counts of ``predictions`` per DailyPredictionStats group, computed in the database.
+
+    Rows are tuples in COLUMNS order. Django may still emit the SELECT columns
+    in another order (plain fields before annotations), so _merge selects
+    them from it by name.
+    """
+    return (predictions
+            .annotate(date=TruncDate('prediction_date'),
+                      age_band=ExpressionWrapper(F('age') / 10 * 10, output_field=IntegerField()))
+            .values(*GROUP_FIELDS)
+            .annotate(predictions=Count('id'),
+                      high_risk=Count('id', filter=Q(heart_disease_risk='have')))
+            .values_list(*COLUMNS)
+            .order_by())
+
+
+def refresh(batch_size=100_000):
+    """Add the predictions created since the last refresh to the rollup.
+
+    Predictions are picked up by id above the watermark, up to ``batch_size``
+    per call, so a refresh only reads new rows. Each batch and its watermark
+    commit together. Deleted or edited predictions are not subtracted;
+    ``rebuild()`` recounts everything. Returns the number of predictions added.
+
+    This assumes ids become visible in increasing order, which holds on
+    SQLite because it runs one write transaction at a time. On a backend
+    with concurrent writers (PostgreSQL, MySQL) a transaction can commit a
+    lower id after a refresh has moved the watermark past it, and that
+    prediction is never counted. Re-reading a window below the watermark
+    doesn't help, because _merge adds to the counts and would count rows
+    twice. On such a backend, also run ``refresh_stats --rebuild``
+    periodically (e.g. nightly) to pick those rows up.
+    """
+    added = 0
+    while True:
+        with transaction.atomic():
+            watermark, _ = (StatsWatermark.objects.select_for_update()
+                            .get_or_create(name=WATERMARK))
+            new = Prediction.objects.filter(id__gt=watermark.last_prediction_id)
+            boundary = list(new.order_by('id').values_list('id', flat=True)[batch_size - 1:batch_size])
+            last_id = boundary[0] if boundary else new.aggregate(last=Max('id'))['last']
+            if last_id is None:
+                return added
+            batch = new.filter(id__lte=last_id)
+            _merge(_aggregate(batch))
+            added += batch.count()
+            watermark.last_prediction_id = last_id
+            watermark.save()
+
+
+def _merge(aggregate):
+    """Add the rows of ``aggregate`` to the rollup with one INSERT ... SELECT.
+
+    Groups that already exist get their counts incremented through
+    ON CONFLICT DO UPDATE (SQLite 3.24+, PostgreSQL), which the ORM's
+    bulk_create can only overwrite, so the statement is built from the
+    aggregate's own SQL, wrapped in a SELECT that lists COLUMNS explicitly.
+    """
+    select, params = aggregate.query.sql_with_params()
+    quote = connection.ops.quote_name
+    table = quote(DailyPredictionStats._meta.db_table)
+    columns = ', '.join(quote(c) for c in COLUMNS)
+    sql = (f"INSERT INTO {table} ({columns}) SELECT {columns} FROM ({select}) AS grouped "
+           # "WHERE true" keeps SQLite from reading ON CONFLICT as a join constraint.
+           "WHERE true "
+           f"ON CONFLICT ({', '.join(quote(c) for c in GROUP_FIELDS)}) DO UPDATE SET "
+           + ', '.join(f'{quote(c)} = {table}.{quote(c)} + excluded.{quote(c)}'
+                       for c in COUNT_FIELDS))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def rebuild():
+    """Recount the whole rollup from the Prediction table."""
+    with transaction.atomic():
+        DailyPredictionStats.objects.all().delete()
+        StatsWatermark.objects.filter(name=WATERMARK).delete()
+    return refresh()
+
+
+def report(by=('gender',), start=None, end=None):
+    """Predictions, high-risk predictions and risk rate per ``by`` group, read from the rollup."""
+    stats = DailyPredictionStats.objects.all()
+    if start is not None:
+        stats = stats.filter(date__gte=start)
+    if end is not None:
+        stats = stats.filter(date__lte=end)
+    rows = (stats.values(*by)
+            .annotate(predictions=Sum('predictions'), high_risk=Sum('high_risk'))
+            .order_by(*by))
+    return [{**row, 'risk_rate': row['high_risk'] / row['predictions']} for row in rows]
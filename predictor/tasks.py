@@ -0,0 +1,21 @@
+from .jobs import enqueue, task
+from .models import Patient, Prediction
+from .utils import build_prediction, get_recommendations, save_predictions
+
+
+@task('save_prediction')
+def save_prediction(patient_id, data, prediction, model_version=''):
+    """Persist a heart() submission that was scored but not saved in the request."""
+    patient = Patient.objects.get(id=patient_id)
+    [saved] = save_predictions([build_prediction(patient, data, prediction,
+                                                 model_version=model_version)])
+    enqueue('suggest_recommendations', prediction_id=saved.id)
+
+
+@task('suggest_recommendations')
+def suggest_recommendations(prediction_id):
+    prediction = Prediction.objects.filter(id=prediction_id).first()
+    if prediction is None:  # deleted in the meantime
+        return
+    prediction.suggested_recommendations = get_recommendations(prediction)
+    prediction.save(update_fields=['suggested_recommendations'])
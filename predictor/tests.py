@@ -1,3 +1,1121 @@
-from django.test import TestCase
+import datetime
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Count, Q
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sklearn.ensemble import RandomForestClassifier
+
+from . import fragments, jobs, metrics, profiling, sqlite, stats, train_model
+from .dashboard import doctor_dashboard
+from .forms import HeartDiseaseForm
+from .forest import FlatForest
+from .inference import FEATURE_COLUMNS, FORM_FIELDS, FeatureCompiler
+from .model_registry import (ModelBundle, ModelRegistry, activate_version, list_versions,
+                             read_active_version, version_path)
+from .async_inference import InferencePool
+from .batching import WriteBehindBatcher
+from .models import (CustomUser, DailyPredictionStats, Doctor, Job, Patient, Prediction,
+                     Recommendation, RequestProfile)
+from .pagination import cursor_for, keyset_queryset
+from .pipeline import HeartFeatureEncoder, ZeroImputer
+from .prediction_cache import PredictionCache
+from .recommendations import recommendations_for_columns, recommendations_for_queryset
+from .scoring import score_frame
+from .utils import get_recommendations, save_predictions
+from .views import PATIENT_ORDERING, PREDICTION_ORDERING
+
+
+def create_doctor(n=0):
+    user = CustomUser.objects.create_user(username=f'doctor{n}@example.com',
+                                          email=f'doctor{n}@example.com', password='pass',
+                                          user_type='doctor', first_name='Doc', last_name=str(n))
+    return Doctor.objects.create(user=user, doctor_id=f'{n:010d}')
+
+
+def create_patient(n=0, doctor=None):
+    user = CustomUser.objects.create_user(username=f'patient{n}@example.com',
+                                          email=f'patient{n}@example.com', password='pass',
+                                          user_type='patient', first_name='Pat', last_name=str(n))
+    return Patient.objects.create(user=user, date_of_birth=datetime.date(1970, 1, 1), doctor=doctor)
+
+
+HEART_FORM = {
+    'age': 54, 'gender': 'M', 'cp': 'ASY', 'trestbps': 140, 'chol': 239, 'fbs': 0,
+    'restecg': 'Normal', 'maxhr': 160, 'exang': 'N', 'oldpeak': 1.2, 'slope': 'Flat',
+}
+
+
+def create_predictions(patient, count):
+    return save_predictions([
+        Prediction(patient=patient, age=50 + i % 20, gender='M', chest_pain_type='ASY',
+                   restingbp=130, cholesterol=220, fastingbs=0, restingecg='Normal', maxhr=150,
+                   exerciseangina='N', oldpeak=1.0, st_slope='Flat', heart_disease_risk='have')
+        for i in range(count)
+    ])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryCountTests(TestCase):
+    """The history pages must not issue a query per patient, prediction or recommendation."""
+
+    # Session and user lookups done by the middleware on every request.
+    REQUEST_QUERIES = 2
+
+    def setUp(self):
+        self.doctor = create_doctor()
+        self.patient = create_patient(doctor=self.doctor)
+
+    def grow(self, size):
+        create_predictions(self.patient, size)
+        Recommendation.objects.bulk_create([
+            Recommendation(patient=self.patient, doctor=self.doctor, content=f'Advice {i}')
+            for i in range(size)
+        ])
+        for i in range(size):
+            create_patient(n=1000 * size + i, doctor=self.doctor)
+
+    def test_patient_profile(self):
+        self.client.force_login(self.patient.user)
+        for size in (1, 10):
+            with self.subTest(size=size):
+                self.grow(size)
+                # patient with latest prediction, history page, recommendations, doctor choices
+                with self.assertNumQueries(self.REQUEST_QUERIES + 4):
+                    response = self.client.get(reverse('profile'))
+                self.assertEqual(response.status_code, 200)
+
+    def test_patient_detail(self):
+        self.client.force_login(self.doctor.user)
+        url = reverse('patient_detail', args=[self.patient.id])
+        for size in (1, 10):
+            with self.subTest(size=size):
+                self.grow(size)
+                # patient with latest prediction, recommendations, history page
+                with self.assertNumQueries(self.REQUEST_QUERIES + 3):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                older = Prediction.objects.filter(patient=self.patient).count() - 1
+                self.assertEqual(len(response.context['history']), min(older, 20))
+
+    def test_doctor_patients(self):
+        self.client.force_login(self.doctor.user)
+        for size in (1, 10):
+            with self.subTest(size=size):
+                self.grow(size)
+                # doctor, patients
+                with self.assertNumQueries(self.REQUEST_QUERIES + 2):
+                    response = self.client.get(reverse('doctor_patients'))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context['patients']),
+                                 Patient.objects.filter(doctor=self.doctor).count())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.doctor = create_doctor()
+        self.patient = create_patient(doctor=self.doctor)
+        # Created in one statement, so many rows share a prediction_date.
+        create_predictions(self.patient, 10)
+        self.expected = list(Prediction.objects.filter(patient=self.patient)
+                             .order_by('-prediction_date', '-id').values_list('id', flat=True))
+
+    @mock.patch('predictor.views.PREDICTIONS_PAGE_SIZE', 3)
+    def test_api_walks_history_in_order(self):
+        self.client.force_login(self.patient.user)
+        url = reverse('patient_predictions_api', args=[self.patient.id])
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            data = response.json()
+            self.assertLessEqual(len(data['results']), 3)
+            seen += [p['id'] for p in data['results']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.expected)
+
+    @mock.patch('predictor.views.PREDICTIONS_PAGE_SIZE', 4)
+    def test_profile_pages_after_latest_prediction(self):
+        self.client.force_login(self.patient.user)
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.context['latest_prediction'].id, self.expected[0])
+        history = response.context['history']
+        self.assertEqual([p.id for p in history], self.expected[1:5])
+
+        response = self.client.get(reverse('profile'), {'cursor': history.next_cursor})
+        self.assertEqual([p.id for p in response.context['history']], self.expected[5:9])
+
+    def test_cursor_page_seeks_the_history_index(self):
+        cursor = cursor_for(Prediction.objects.get(id=self.expected[5]), PREDICTION_ORDERING)
+        page = keyset_queryset(Prediction.objects.filter(patient=self.patient),
+                               PREDICTION_ORDERING, cursor, page_size=3)
+        plan = page.explain()
+        self.assertIn('USING INDEX prediction_patient_date_id_idx (patient_id=? AND prediction_date<?)', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertEqual([p.id for p in page], self.expected[6:10])
+
+    @mock.patch('predictor.views.PATIENTS_PAGE_SIZE', 2)
+    def test_patient_list_pages_by_id(self):
+        for n in range(1, 5):
+            create_patient(n, doctor=self.doctor)
+        patients = Patient.objects.filter(doctor=self.doctor)
+        cursor = cursor_for(patients.order_by('id')[1], PATIENT_ORDERING)
+        plan = keyset_queryset(patients, PATIENT_ORDERING, cursor).explain()
+        self.assertIn('(doctor_id=? AND rowid>?)', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+        self.client.force_login(self.doctor.user)
+        url = reverse('doctor_patients_api')
+        seen, cursor = [], None
+        while True:
+            data = self.client.get(url, {'cursor': cursor} if cursor else {}).json()
+            seen += [p['id'] for p in data['results']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, list(patients.order_by('id').values_list('id', flat=True)))
+
+    def test_invalid_cursor(self):
+        self.client.force_login(self.patient.user)
+        url = reverse('patient_predictions_api', args=[self.patient.id])
+        self.assertEqual(self.client.get(url, {'cursor': 'nonsense'}).status_code, 400)
+
+    def test_other_patients_history_is_forbidden(self):
+        other = create_patient(n=1)
+        self.client.force_login(other.user)
+        url = reverse('patient_predictions_api', args=[self.patient.id])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LatestPredictionSnapshotTests(TestCase):
+    def setUp(self):
+        self.patient = create_patient()
+
+    def assertSnapshot(self, prediction):
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.latest_prediction_id, prediction and prediction.id)
+        self.assertEqual(self.patient.latest_risk, prediction.heart_disease_risk if prediction else '')
+
+    def test_heart_post_updates_snapshot(self):
+        self.client.force_login(self.patient.user)
+        self.client.post(reverse('heart'), HEART_FORM)
+        self.assertSnapshot(Prediction.objects.get(patient=self.patient))
+
+    def test_delete_and_backfill(self):
+        older, newest = create_predictions(self.patient, 2)
+        self.assertSnapshot(newest)
+        newest.delete()
+        self.assertSnapshot(older)
+
+        Patient.objects.update(latest_prediction=None, latest_risk='', latest_prediction_date=None)
+        call_command('backfill_latest_predictions', stdout=open(os.devnull, 'w'))
+        self.assertSnapshot(older)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BatchPredictionTests(TestCase):
+    def setUp(self):
+        self.doctor = create_doctor()
+        self.patient = create_patient(0, doctor=self.doctor)
+        self.foreign = create_patient(1)
+        df = pd.read_csv(os.path.join(settings.BASE_DIR, 'static', 'heart.csv')).head(12)
+        self.records = [{field: row[col] for col, field in FORM_FIELDS.items()}
+                        for row in df.to_dict('records')]
+
+    def post(self, records):
+        return self.client.post(reverse('predict_batch'), json.dumps({'records': records}),
+                                content_type='application/json')
+
+    def test_patient_batch_is_saved_to_own_profile(self):
+        self.client.force_login(self.patient.user)
+        records = [dict(record, patient_id=self.foreign.id) for record in self.records[:3]]
+        response = self.post(records)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([(r['patient_id'], r['saved']) for r in results],
+                         [(self.patient.id, True)] * 3)
+        self.assertEqual(Prediction.objects.filter(patient=self.patient).count(), 3)
+        self.assertFalse(Prediction.objects.filter(patient=self.foreign).exists())
+
+    def test_doctor_batch_is_saved_for_own_patients_only(self):
+        self.client.force_login(self.doctor.user)
+        records = [dict(self.records[0], patient_id=self.patient.id),
+                   dict(self.records[1], patient_id=str(self.patient.id)),
+                   dict(self.records[2], patient_id=self.foreign.id),
+                   dict(self.records[3])]
+        response = self.post(records)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([(r['patient_id'], r['saved']) for r in results],
+                         [(self.patient.id, True), (self.patient.id, True), (None, False),
+                          (None, False)])
+        self.assertTrue(all(r['heart_disease_risk'] for r in results))
+        self.assertEqual(Prediction.objects.filter(patient=self.patient).count(), 2)
+        self.assertFalse(Prediction.objects.filter(patient=self.foreign).exists())
+
+    def test_invalid_records(self):
+        self.client.force_login(self.doctor.user)
+        records = [self.records[0], dict(self.records[1], age='old'),
+                   dict(self.records[2], patient_id='12a'), dict(self.records[3], patient_id=True),
+                   'not a record']
+        response = self.post(records)
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual(sorted(errors), ['1', '2', '3', '4'])
+        self.assertIn('age', errors['1'])
+        self.assertIn('patient_id', errors['2'])
+        self.assertIn('patient_id', errors['3'])
+        self.assertFalse(Prediction.objects.exists())
+
+        self.assertEqual(self.client.post(reverse('predict_batch'), 'nope',
+                                          content_type='application/json').status_code, 400)
+
+    def test_too_many_records(self):
+        self.client.force_login(self.patient.user)
+        with mock.patch('predictor.views.BATCH_MAX_RECORDS', 5):
+            self.assertEqual(self.post(self.records[:5]).status_code, 200)
+            self.assertEqual(self.post(self.records[:6]).status_code, 413)
+        self.assertEqual(Prediction.objects.count(), 5)
+
+    def test_matches_single_predictions(self):
+        self.client.force_login(self.patient.user)
+        batch = self.post(self.records).json()['results']
+        Prediction.objects.all().delete()
+        single = []
+        for record in self.records:
+            self.client.post(reverse('heart'), record)
+            single.append(Prediction.objects.filter(patient=self.patient)
+                          .latest('id').heart_disease_risk)
+        self.assertEqual([r['heart_disease_risk'] for r in batch], single)
+        self.assertEqual(len(set(single)), 2)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AsyncHeartTests(TestCase):
+    def setUp(self):
+        self.patient = create_patient()
+
+    async def test_post_scores_and_saves(self):
+        await self.async_client.aforce_login(self.patient.user)
+        response = await self.async_client.post(reverse('heart_async'), HEART_FORM)
+        self.assertRedirects(response, reverse('profile'), fetch_redirect_response=False)
+        prediction = await Prediction.objects.aget(patient=self.patient)
+        self.assertEqual(prediction.cholesterol, 239)
+        self.assertTrue(prediction.model_version)
+
+    async def test_records_heart_stages(self):
+        metrics.reset()
+        await self.async_client.aforce_login(self.patient.user)
+        await self.async_client.post(reverse('heart_async'), HEART_FORM)
+        for stage in ('validate', 'predict', 'save'):
+            self.assertEqual(metrics.STAGE_SECONDS.count(stage), 1, stage)
+
+    async def test_get_renders_form(self):
+        await self.async_client.aforce_login(self.patient.user)
+        response = await self.async_client.get(reverse('heart_async'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('form', response.context)
+
+    async def test_anonymous_is_sent_to_login(self):
+        response = await self.async_client.get(reverse('heart_async'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/login', response['Location'])
+
+    async def test_saturated_pool_returns_503(self):
+        await self.async_client.aforce_login(self.patient.user)
+        full = InferencePool(max_workers=1, max_pending=0)
+        with mock.patch('predictor.views.get_inference_pool', return_value=full):
+            response = await self.async_client.post(reverse('heart_async'), HEART_FORM)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(await Prediction.objects.filter(patient=self.patient).aexists())
+
+
+@jobs.task('test_fail')
+def fail_task():
+    raise RuntimeError("boom")
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.patient = create_patient()
+
+    @mock.patch('predictor.views.DEFERRED_SAVE', True)
+    def test_deferred_heart_save(self):
+        self.client.force_login(self.patient.user)
+        response = self.client.post(reverse('heart'), HEART_FORM)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.context['result'], ('have', "don't have"))
+        self.assertFalse(Prediction.objects.exists())
+        self.assertEqual(jobs.stats()['pending'], 1)
+
+        jobs.work(once=True)
+        prediction = Prediction.objects.get(patient=self.patient)
+        self.assertEqual(prediction.heart_disease_risk, response.context['result'])
+        self.assertTrue(prediction.suggested_recommendations)
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.latest_prediction_id, prediction.id)
+        stats = jobs.stats()
+        self.assertEqual((stats['pending'], stats['done']), (0, 2))
+
+    def test_failed_job_is_retried_then_given_up(self):
+        job = jobs.enqueue('test_fail', max_attempts=2)
+        with self.assertLogs('predictor.jobs', 'WARNING'):
+            jobs.work(once=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertIn('boom', job.last_error)
+        self.assertEqual(jobs.claim(), [])  # backing off
+
+        Job.objects.filter(id=job.id).update(run_at=job.created_at)
+        with self.assertLogs('predictor.jobs', 'ERROR'):
+            jobs.work(once=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_job_is_claimed_once(self):
+        job = jobs.enqueue('suggest_recommendations', prediction_id=0)
+        self.assertEqual(jobs.claim(), [job])
+        self.assertEqual(jobs.claim(), [])
+
+
+def legacy_recommendations(p):
+    """get_recommendations as it was written before the rules became data."""
+    recommendations = []
+    if p.heart_disease_risk == 'have':
+        if p.cholesterol > 200:
+            recommendations.append("Heart-healthy diet and regular moderate-intensity exercise"
+                                   "recommended.")
+        if p.restingbp > 130:
+            recommendations.append("Regularly monitor your blood pressure and adopt lifestyle"
+                                   "changes.")
+        if p.fastingbs == 1:
+            recommendations.append("Balanced diet, regular exercise and further medical evaluation"
+                                   "for diabetes recommended.")
+        if p.exerciseangina == 'Y':
+            recommendations.append("Avoid strenuous activities until further evaluation is completed.")
+        if p.chest_pain_type != 'ASY' or p.restingecg != 'Normal' or \
+           p.oldpeak > 1 or p.st_slope != 'Flat':
+            recommendations.append("Further medical evaluation needed.")
+    else:
+        recommendations.append("The patient is okay with no significant risks detected.")
+    return recommendations
+
+
+class RecommendationRuleTests(TestCase):
+    def setUp(self):
+        grid = itertools.product(['have', "don't have"], [180, 201], [130, 131], [0, 1], ['Y', 'N'],
+                                 ['ASY', 'TA'], ['Normal', 'ST'], [1.0, 1.5], ['Flat', 'Up'])
+        self.predictions = [
+            Prediction(id=i, heart_disease_risk=risk, cholesterol=chol, restingbp=bp, fastingbs=fbs,
+                       exerciseangina=exang, chest_pain_type=cp, restingecg=ecg, oldpeak=oldpeak,
+                       st_slope=slope)
+            for i, (risk, chol, bp, fbs, exang, cp, ecg, oldpeak, slope) in enumerate(grid)
+        ]
+        self.expected = [legacy_recommendations(p) for p in self.predictions]
+
+    def test_single_prediction_matches_legacy(self):
+        self.assertEqual([get_recommendations(p) for p in self.predictions], self.expected)
+
+    def test_columns_match_legacy(self):
+        columns = {field: [getattr(p, field) for p in self.predictions]
+                   for field in ('heart_disease_risk', 'cholesterol', 'restingbp', 'fastingbs',
+                                 'exerciseangina', 'chest_pain_type', 'restingecg', 'oldpeak',
+                                 'st_slope')}
+        self.assertEqual(recommendations_for_columns(columns), self.expected)
+        self.assertEqual(recommendations_for_columns({field: [] for field in columns}), [])
+
+    def test_queryset_matches_legacy(self):
+        patient = create_patient()
+        for p in self.predictions:
+            p.id = None
+            p.patient = patient
+            p.age, p.gender, p.maxhr = 50, 'M', 150
+        saved = Prediction.objects.bulk_create(self.predictions)
+        result = recommendations_for_queryset(Prediction.objects.filter(patient=patient))
+        self.assertEqual([result[p.id] for p in saved], self.expected)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class DoctorDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.patients = [create_patient(n, doctor=self.doctor) for n in range(3)]
+        create_predictions(self.patients[0], 3)
+        create_predictions(self.patients[1], 1)
+        create_patient(n=9)  # not one of the doctor's patients
+        create_predictions(Patient.objects.get(user__username='patient9@example.com'), 2)
+
+    def test_aggregates(self):
+        dashboard = doctor_dashboard(self.doctor)
+        self.assertEqual(dashboard['patients'], 3)
+        self.assertEqual(dashboard['risk_counts'], {'have': 2, "don't have": 0, 'no prediction': 1})
+        self.assertEqual(sum(month['total'] for month in dashboard['trend']), 4)
+        self.assertEqual(dashboard['trend'][-1]['cumulative'], 4)
+        cholesterol = dashboard['distributions']['cholesterol']
+        self.assertEqual((cholesterol['min'], cholesterol['max']), (220, 220))
+        self.assertEqual(cholesterol['histogram'], [{'from': 200, 'count': 2}])
+
+    def test_cached_until_a_patient_gets_a_prediction(self):
+        doctor_dashboard(self.doctor)
+        with self.assertNumQueries(0):
+            doctor_dashboard(self.doctor)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_predictions(self.patients[2], 1)
+        self.assertEqual(doctor_dashboard(self.doctor)['risk_counts']['no prediction'], 0)
+
+    def test_views(self):
+        self.client.force_login(self.doctor.user)
+        self.assertEqual(self.client.get(reverse('doctor_dashboard')).status_code, 200)
+        response = self.client.get(reverse('doctor_dashboard_api'))
+        self.assertEqual(response.json()['patients'], 3)
+
+        self.client.force_login(self.patients[0].user)
+        self.assertEqual(self.client.get(reverse('doctor_dashboard_api')).status_code, 403)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class DailyStatsTests(TestCase):
+    def setUp(self):
+        self.patient = create_patient()
+
+    def add_predictions(self, count):
+        save_predictions([
+            Prediction(patient=self.patient, age=35 + 7 * i % 40, gender='MF'[i % 2],
+                       chest_pain_type=['ASY', 'NAP', 'TA'][i % 3], restingbp=130, cholesterol=220,
+                       fastingbs=0, restingecg='Normal', maxhr=150, exerciseangina='N', oldpeak=1.0,
+                       st_slope='Flat', heart_disease_risk=['have', "don't have"][i % 5 == 0])
+            for i in range(count)
+        ])
+
+    def expected_by_gender(self):
+        return [
+            {'gender': row['gender'], 'predictions': row['n'], 'high_risk': row['high'],
+             'risk_rate': row['high'] / row['n']}
+            for row in Prediction.objects.values('gender').order_by('gender').annotate(
+                n=Count('id'), high=Count('id', filter=Q(heart_disease_risk='have')))
+        ]
+
+    def test_incremental_refresh(self):
+        self.add_predictions(25)
+        self.assertEqual(stats.refresh(batch_size=10), 25)
+        self.assertEqual(stats.refresh(), 0)
+        self.add_predictions(7)
+        self.assertEqual(stats.refresh(), 7)
+        self.assertEqual(stats.report(['gender']), self.expected_by_gender())
+        self.assertEqual(sum(row['predictions'] for row in stats.report(['age_band'])), 32)
+
+        rollup = list(DailyPredictionStats.objects.order_by('id').values())
+        self.assertEqual(stats.rebuild(), 32)
+        self.assertEqual(stats.report(['gender']), self.expected_by_gender())
+        self.assertEqual(len(rollup), DailyPredictionStats.objects.count())
+
+    def test_rollup_columns_match_the_aggregate(self):
+        self.add_predictions(12)
+        stats.refresh()
+        rollup = DailyPredictionStats.objects.values_list(*stats.COLUMNS).order_by(*stats.GROUP_FIELDS)
+        self.assertEqual(list(rollup), sorted(stats._aggregate(Prediction.objects.all())))
+
+    def test_report_reads_only_the_rollup(self):
+        self.add_predictions(10)
+        call_command('refresh_stats', stdout=open(os.devnull, 'w'))
+        with CaptureQueriesContext(connection) as queries:
+            stats.report(['date', 'chest_pain_type'])
+        self.assertNotIn(Prediction._meta.db_table, ' '.join(q['sql'] for q in queries))
+
+    def test_api_is_staff_only(self):
+        self.add_predictions(4)
+        stats.refresh()
+        url = reverse('stats_report_api')
+        self.client.force_login(self.patient.user)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.patient.user.is_staff = True
+        self.patient.user.save()
+        response = self.client.get(url, {'by': 'date,gender'})
+        self.assertEqual(sum(row['predictions'] for row in response.json()['results']), 4)
+        self.assertEqual(self.client.get(url, {'by': 'doctor'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': 'yesterday'}).status_code, 400)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.patient = create_patient()
+        self.client.force_login(self.patient.user)
+
+    def test_heart_stages_and_queries(self):
+        self.client.post(reverse('heart'), HEART_FORM)
+        for stage in ('validate', 'predict', 'save'):
+            self.assertEqual(metrics.STAGE_SECONDS.count(stage), 1, stage)
+        self.assertEqual(metrics.VIEW_DB_QUERIES.count('heart'), 1)
+        self.assertGreater(metrics.VIEW_DB_QUERIES.quantile(0.5, 'heart'), 0)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('# TYPE predictor_stage_seconds histogram', text)
+        self.assertIn('predictor_stage_seconds_count{stage="predict"} 1', text)
+        self.assertIn('predictor_view_db_queries_bucket{view="heart",le="+Inf"} 1', text)
+        summary = self.client.get(reverse('metrics'), {'format': 'json'}).json()
+        [row] = [row for row in summary['predictor_view_seconds'] if row['view'] == 'heart']
+        self.assertEqual(row['count'], 1)
+        self.assertLessEqual(row['p50'], row['p95'])
+
+    def test_quantile(self):
+        histogram = metrics.Histogram('test', '', buckets=(1, 2, 4))
+        for value in (0.5, 1.5, 1.5, 3):
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(0.5), 1.5)
+        self.assertEqual(histogram.quantile(1.0), 4)
+        self.assertEqual(histogram.count(), 4)
+
+    def test_only_internal_ips_and_staff(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1').status_code, 403)
+
+    def test_disabled(self):
+        with mock.patch.object(metrics, 'enabled', False):
+            self.client.post(reverse('heart'), HEART_FORM)
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        self.assertEqual(metrics.STAGE_SECONDS.count('predict'), 0)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(PREDICTOR_PROFILING=True, PREDICTOR_PROFILE_SAMPLE_RATE=1.0,
+                                              PREDICTOR_PROFILE_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.patient = create_patient()
+
+    def test_samples_listed_views(self):
+        self.client.force_login(self.patient.user)
+        self.client.get(reverse('profile'))
+        self.client.get(reverse('home'))
+        profile = RequestProfile.objects.get()
+        self.assertEqual((profile.view_name, profile.user_type, profile.trigger),
+                         ('profile', 'patient', RequestProfile.SAMPLED))
+        self.assertGreater(profile.query_count, 0)
+        self.assertIn('profile', profiling.top_functions(profile))
+
+    def test_staff_token(self):
+        staff = CustomUser.objects.create_user(username='staff@example.com', password='pass',
+                                               user_type='doctor', is_staff=True)
+        token = profiling.profile_token(staff)
+        self.client.force_login(self.patient.user)
+        response = self.client.get(reverse('home'), {'_profile': token})
+        self.assertNotIn('X-Profile-Id', response)
+
+        self.client.force_login(staff)
+        response = self.client.get(reverse('home'), HTTP_X_PROFILE_TOKEN=token)
+        profile = RequestProfile.objects.get(id=response['X-Profile-Id'])
+        self.assertEqual(profile.trigger, RequestProfile.REQUESTED)
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('home'), {'_profile': token + 'x'}))
+
+    def test_admin_lists_slowest_first(self):
+        self.client.force_login(self.patient.user)
+        for _ in range(3):
+            self.client.get(reverse('profile'))
+        admin_user = CustomUser.objects.create_superuser(username='admin@example.com', password='pass',
+                                                         user_type='doctor')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:predictor_requestprofile_changelist'),
+                                   {'view_name': 'profile'})
+        self.assertEqual([p.id for p in response.context['cl'].result_list],
+                         list(RequestProfile.objects.filter(view_name='profile')
+                              .order_by('-duration').values_list('id', flat=True)))
+        # The token is timestamped, so check the one the page shows rather than a fresh one.
+        token = response.context['profile_token']
+        self.assertContains(response, f'?_profile={token}')
+        self.assertTrue(profiling.token_is_valid(token, admin_user))
+        profile = RequestProfile.objects.filter(view_name='profile').first()
+        response = self.client.get(reverse('admin:predictor_requestprofile_change', args=[profile.id]))
+        self.assertContains(response, 'cumulative')
+        response = self.client.get(reverse('admin:predictor_requestprofile_download', args=[profile.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_prune(self):
+        self.client.force_login(self.patient.user)
+        with override_settings(PREDICTOR_PROFILE_KEEP=2):
+            for _ in range(3):
+                self.client.get(reverse('profile'))
+        self.assertEqual(RequestProfile.objects.count(), 2)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         sorted(RequestProfile.objects.values_list('stats_file', flat=True)))
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        fragments.fragment_cache().clear()
+        self.doctor = create_doctor()
+        self.patient = create_patient(doctor=self.doctor)
+        self.older, self.latest = create_predictions(self.patient, 2)
+        self.recommendation = Recommendation.objects.create(patient=self.patient, doctor=self.doctor,
+                                                            content='Walk daily')
+        self.url = reverse('patient_detail', args=[self.patient.id])
+        self.client.force_login(self.doctor.user)
+
+    def test_cards_are_rendered_once(self):
+        first = self.client.get(self.url)
+        self.assertContains(first, f'id="collapse{self.older.id}"')
+        self.assertContains(first, 'Walk daily')
+        with mock.patch('predictor.fragments.render_to_string') as render:
+            second = self.client.get(self.url)
+        render.assert_not_called()
+        self.assertEqual(first.content, second.content)
+
+    def test_saves_and_deletes_invalidate(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.older.cholesterol = 412
+            self.older.save()
+            self.recommendation.content = 'Swim daily'
+            self.recommendation.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, '412')
+        self.assertContains(response, 'Swim daily')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.user.last_name = 'Renamed'
+            self.doctor.user.save()
+        self.assertContains(self.client.get(self.url), 'by Dr. Doc Renamed')
+
+        key = fragments.fragment_key('prediction', self.older.id)
+        self.assertIsNotNone(fragments.fragment_cache().get(key))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.older.delete()
+        self.assertIsNone(fragments.fragment_cache().get(key))
+
+    def test_cards_keep_each_pages_labels(self):
+        detail = self.client.get(self.url)
+        self.assertContains(detail, 'Cholesterol [mm/dl]:', count=2)
+        self.client.force_login(self.patient.user)
+        profile = self.client.get(reverse('profile'))
+        self.assertContains(profile, f'id="collapse{self.older.id}"')
+        self.assertContains(profile, '<strong>Cholesterol:</strong>', count=2)
+        self.assertContains(profile, '<ul class="list-group mb-3">')
+        self.assertNotContains(profile, '[mm/dl]')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.older.cholesterol = 412
+            self.older.save()
+        self.assertContains(self.client.get(reverse('profile')), '412')
+
+    @override_settings(PREDICTOR_FRAGMENT_CACHE_ALIAS=None)
+    def test_without_cache(self):
+        self.assertContains(self.client.get(self.url), f'id="collapse{self.older.id}"')
+
+
+class SqlitePerformanceTests(TestCase):
+    def journal_settings(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = connections['default'].__class__({**connection.settings_dict,
+                                                        'NAME': os.path.join(directory, 'db.sqlite3')})
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    journal_mode = cursor.fetchone()[0]
+                    cursor.execute('PRAGMA synchronous')
+                    return journal_mode, cursor.fetchone()[0]
+            finally:
+                wrapper.close()
+
+    def test_pragmas_on_new_connections(self):
+        self.assertEqual(self.journal_settings(), ('delete', 2))
+        with override_settings(PREDICTOR_SQLITE_PERFORMANCE=True):
+            self.assertEqual(self.journal_settings(), ('wal', 1))
+        with override_settings(PREDICTOR_SQLITE_PERFORMANCE={'synchronous': 'full'}):
+            self.assertEqual(sqlite.pragmas()['journal_mode'], 'wal')
+            self.assertEqual(self.journal_settings(), ('wal', 2))
+
+
+class WriteBehindTests(TestCase):
+    def test_batches_and_isolates_failures(self):
+        saved = []
+
+        def save_many(objects):
+            if 'bad' in objects:
+                raise ValueError('bad object')
+            saved.append(list(objects))
+
+        writer = WriteBehindBatcher(save_many, max_batch=10, max_wait_ms=50)
+        with self.assertLogs('predictor.batching', 'ERROR'):
+            futures = [writer.submit(obj) for obj in ['a', 'b', 'bad', 'c']]
+            self.assertTrue(writer.flush(timeout=5))
+        self.assertEqual(sorted(obj for batch in saved for obj in batch), ['a', 'b', 'c'])
+        self.assertLess(len(saved), 4)
+        with self.assertRaises(ValueError):
+            futures[2].result()
+        self.assertIsNone(futures[0].result())
+
+    def test_heart_hands_prediction_to_writer(self):
+        patient = create_patient()
+        saved = []
+        writer = WriteBehindBatcher(saved.extend, max_wait_ms=1)
+        self.client.force_login(patient.user)
+        with mock.patch('predictor.views.prediction_writer', writer):
+            response = self.client.post(reverse('heart'), HEART_FORM)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(writer.flush(timeout=5))
+        [prediction] = saved
+        self.assertEqual((prediction.patient_id, prediction.heart_disease_risk),
+                         (patient.id, response.context['result']))
+
+
+class PipelineParityTests(TestCase):
+    """The pipeline.pkl bundles must score heart.csv as the separate
+    poly/scaler/model/label_encoders pickles they replaced did. Rows without a
+    cholesterol measurement are the exception: those used to be filled with
+    the median of whatever batch they came in, now always with the training
+    median stored in the bundle."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(os.path.join(os.path.dirname(__file__), 'test_data', 'pipeline_parity.json')) as f:
+            cls.expected = json.load(f)
+        cls.df = pd.read_csv(os.path.join(settings.BASE_DIR, 'static', 'heart.csv'))
+        cls.records = [{FORM_FIELDS[col]: value for col, value in row.items() if col in FORM_FIELDS}
+                       for row in cls.df.to_dict('records')]
+        cls.measured = (cls.df['Cholesterol'] != 0).tolist()
+
+    def assertMeasuredEqual(self, predictions, expected):
+        self.assertEqual(len(predictions), len(expected))
+        for i, (got, want) in enumerate(zip(predictions, expected)):
+            if self.measured[i]:
+                self.assertEqual(str(got), want, f"row {i}")
+
+    def test_records(self):
+        for version, expected in self.expected.items():
+            with self.subTest(version=version):
+                bundle = ModelBundle(version)
+                self.assertMeasuredEqual(bundle.predict_many(self.records), expected['records'])
+
+    def test_frames(self):
+        for version, expected in self.expected.items():
+            with self.subTest(version=version):
+                bundle = ModelBundle(version)
+                # The whole file's median is the 223 the bundles were trained with.
+                self.assertEqual(''.join(map(str, score_frame(bundle, self.df))), expected['frame'])
+                self.assertMeasuredEqual(score_frame(bundle, self.df.head(50)),
+                                         expected['frame_head_50'])
+
+    def test_batch_independent(self):
+        bundle = ModelBundle('rf-v1')
+        predictions = bundle.predict_many(self.records)
+        self.assertEqual(list(score_frame(bundle, self.df)), predictions)
+        self.assertEqual(list(score_frame(bundle, self.df.head(50))), predictions[:50])
+        unmeasured = self.df[self.df['Cholesterol'] == 0].index[0]
+        self.assertEqual(bundle.predict(self.records[unmeasured]), predictions[unmeasured])
+
+    def test_fast_path_matches_pipeline(self):
+        bundle = ModelBundle('rf-v1')
+        rows = self.df[self.df['Cholesterol'] == 0].head(5).index.tolist() + [0, 1, 2]
+        for i in rows:
+            self.assertEqual(bundle.predict(self.records[i]),
+                             bundle.predict_frame(self.df.iloc[[i]])[0])
+
+    def test_imputer_uses_measured_median(self):
+        X = HeartFeatureEncoder().fit().transform(self.df)
+        imputer = ZeroImputer().fit(X)
+        measured = self.df.loc[self.df['Cholesterol'] != 0, 'Cholesterol']
+        self.assertEqual(imputer.fill_values_, {'Cholesterol': float(measured.median())})
+        column = FEATURE_COLUMNS.index('Cholesterol')
+        self.assertFalse((imputer.transform(X[:1] * 0)[:, column] == 0).any())
+
+    def test_unknown_category(self):
+        df = self.df.head(3).copy()
+        df.loc[1, 'ChestPainType'] = 'XYZ'
+        with self.assertRaisesMessage(ValueError, "Unknown category 'XYZ' for 'ChestPainType'"):
+            HeartFeatureEncoder().fit().transform(df)
+
+
+class FastPathParityTests(TestCase):
+    """The InferenceEngine fast path must agree with the pipeline it was derived
+    from, for every version, on heart.csv submitted through HeartDiseaseForm."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.df = pd.read_csv(os.path.join(settings.BASE_DIR, 'static', 'heart.csv'))
+        forms = [HeartDiseaseForm({field: row[col] for col, field in FORM_FIELDS.items()})
+                 for row in cls.df.to_dict('records')]
+        forms.append(HeartDiseaseForm(HEART_FORM))
+        cls.cleaned = [form.cleaned_data for form in forms if form.is_valid()]
+        assert len(cls.cleaned) == len(forms)
+        cls.df = pd.concat([cls.df, pd.DataFrame([{col: HEART_FORM[field] for col, field
+                                                    in FORM_FIELDS.items()}])],
+                           ignore_index=True)
+        cls.bundles = [ModelBundle(version) for version in list_versions()]
+
+    def test_encode_matches_pipeline(self):
+        for bundle in self.bundles:
+            with self.subTest(version=bundle.version):
+                expected = bundle.pipeline[:2].transform(self.df)
+                np.testing.assert_array_equal(bundle.engine.encode_many(self.cleaned), expected)
+                for i in (0, len(self.cleaned) - 1):
+                    np.testing.assert_array_equal(bundle.engine.encode(self.cleaned[i]),
+                                                  expected[i:i + 1])
+
+    def test_predictions_match_pipeline(self):
+        for bundle in self.bundles:
+            with self.subTest(version=bundle.version):
+                expected = [int(p) for p in bundle.predict_frame(self.df)]
+                self.assertEqual(bundle.predict_many(self.cleaned), expected)
+                self.assertEqual(bundle.predict(self.cleaned[-1]), expected[-1])
+
+    def test_compiled_transform_matches_poly_and_scaler(self):
+        for bundle in self.bundles:
+            with self.subTest(version=bundle.version):
+                steps = bundle.pipeline.named_steps
+                X = bundle.engine.encode_many(self.cleaned)
+                expected = steps['scaler'].transform(steps['poly'].transform(X))
+                fresh = FeatureCompiler.from_transformers(steps['poly'], steps['scaler'])
+                # The saved feature_compiler.npz must belong to the pipeline next to it.
+                np.testing.assert_array_equal(bundle.engine.compiler.transform(X), expected)
+                np.testing.assert_array_equal(fresh.transform(X), expected)
+                np.testing.assert_array_equal(fresh.transform(X[:1]), expected[:1])
+
+    def test_flat_forest_matches_sklearn(self):
+        forests = [bundle for bundle in self.bundles
+                   if isinstance(bundle.pipeline.named_steps['model'], RandomForestClassifier)]
+        self.assertTrue(forests)
+        for bundle in forests:
+            with self.subTest(version=bundle.version):
+                steps = bundle.pipeline.named_steps
+                model = steps['model']
+                X = steps['scaler'].transform(steps['poly'].transform(
+                    bundle.engine.encode_many(self.cleaned)))
+                expected = model.predict_proba(X)
+                flat = FlatForest.from_sklearn(model)
+                np.testing.assert_array_equal(flat.predict_proba(X), expected)
+                np.testing.assert_array_equal(flat.predict(X), model.predict(X))
+                np.testing.assert_array_equal(flat.predict_proba(X[0]), expected[:1])
+                with tempfile.TemporaryDirectory() as tmp:
+                    flat.save(tmp)
+                    np.testing.assert_array_equal(FlatForest.load(tmp).predict_proba(X), expected)
+                saved = os.path.join(version_path(bundle.version), 'forest')
+                if os.path.isdir(saved):
+                    # The exported forest/ must belong to the pipeline next to it.
+                    np.testing.assert_array_equal(FlatForest.load(saved).predict_proba(X), expected)
+
+
+class ModelHotSwapTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = tmp.name
+        os.mkdir(os.path.join(self.path, 'versions'))
+        for version in ('rf-v1', 'voting-v1'):
+            os.symlink(version_path(version), version_path(version, self.path))
+        activate_version('rf-v1', self.path)
+        self.registry = ModelRegistry(self.path, check_interval=60)
+        self.now = time.monotonic()
+
+    def current(self, seconds_later=0):
+        """registry.current() at ``seconds_later``, after any swap it started has finished."""
+        with mock.patch('predictor.model_registry.time.monotonic',
+                        return_value=self.now + seconds_later):
+            self.registry.current()
+        loading = self.registry._loading
+        if loading is not None:
+            loading.join()
+        return self.registry.current()
+
+    def test_activated_version_is_picked_up_after_check_interval(self):
+        self.assertEqual(self.current().version, 'rf-v1')
+        activate_version('voting-v1', self.path)
+        self.assertEqual(self.current(30).version, 'rf-v1')
+        self.assertEqual(self.current(61).version, 'voting-v1')
+        self.assertIn(self.registry.predict(HEART_FORM), (0, 1))
+
+    def test_broken_bundle_keeps_old_version(self):
+        self.assertEqual(self.current().version, 'rf-v1')
+        broken = version_path('broken', self.path)
+        os.mkdir(broken)
+        with open(os.path.join(broken, 'pipeline.pkl'), 'wb') as f:
+            f.write(b'not a pickle')
+        activate_version('broken', self.path)
+        with self.assertLogs('predictor.model_registry', 'ERROR') as logs:
+            self.assertEqual(self.current(61).version, 'rf-v1')
+        self.assertIn("Could not load model version 'broken'; keeping 'rf-v1'", logs.output[0])
+        # Not retried until ACTIVE changes again.
+        self.assertEqual(self.current(122).version, 'rf-v1')
+        activate_version('voting-v1', self.path)
+        self.assertEqual(self.current(183).version, 'voting-v1')
+
+    def test_activate_version_replaces_active_atomically(self):
+        active = os.path.join(self.path, 'ACTIVE')
+        with self.assertRaisesMessage(ValueError, "Unknown model version 'rf-v9'"):
+            activate_version('rf-v9', self.path)
+        self.assertEqual(read_active_version(self.path), 'rf-v1')
+
+        seen, done = set(), threading.Event()
+
+        def read():
+            while not done.is_set():
+                with open(active) as f:
+                    seen.add(f.read())
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        try:
+            for version in ['voting-v1', 'rf-v1'] * 100:
+                activate_version(version, self.path)
+        finally:
+            done.set()
+            reader.join()
+        self.assertEqual(seen, {'rf-v1\n', 'voting-v1\n'})
+        self.assertEqual(sorted(os.listdir(self.path)), ['ACTIVE', 'versions'])
+
+
+class PredictionCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.bundle = ModelBundle('rf-v1')
+        df = pd.read_csv(os.path.join(settings.BASE_DIR, 'static', 'heart.csv')).head(8)
+        cls.records = [{field: row[col] for col, field in FORM_FIELDS.items()}
+                       for row in df.to_dict('records')]
+        cls.expected = cls.bundle.predict_many(cls.records)
+
+    def setUp(self):
+        metrics.reset()
+        self.cache = PredictionCache('predictions')
+        self.cache.cache.clear()
+        self.engine = mock.patch.object(self.bundle.engine, 'predict_encoded',
+                                        wraps=self.bundle.engine.predict_encoded)
+        self.predict_encoded = self.engine.start()
+        self.addCleanup(self.engine.stop)
+
+    def scored_rows(self):
+        return [len(call.args[0]) for call in self.predict_encoded.call_args_list]
+
+    def test_repeated_input_skips_the_model(self):
+        first = self.cache.predict(self.bundle, self.records[0])
+        self.assertEqual(self.cache.predict(self.bundle, dict(self.records[0])), first)
+        self.assertEqual(first, self.expected[0])
+        self.assertEqual(self.scored_rows(), [1])
+        self.assertEqual(metrics.PREDICTION_CACHE_LOOKUPS.count('hit'), 1)
+        self.assertEqual(metrics.PREDICTION_CACHE_LOOKUPS.count('miss'), 1)
+
+    def test_version_is_part_of_the_key(self):
+        row = self.bundle.engine.encode_many(self.records[:1])[0]
+        self.assertNotEqual(PredictionCache.key('rf-v1', row), PredictionCache.key('rf-v2', row))
+        self.cache.predict(self.bundle, self.records[0])
+        retrained = mock.Mock(version='rf-v2', engine=self.bundle.engine)
+        self.cache.predict(retrained, self.records[0])
+        self.assertEqual(self.scored_rows(), [1, 1])
+
+    def test_mixed_hits_and_misses_keep_input_order(self):
+        self.cache.predict_many(self.bundle, self.records[::3])
+        self.assertEqual(self.cache.predict_many(self.bundle, self.records), self.expected)
+        self.assertEqual(self.scored_rows(), [3, 5])
+        self.assertEqual(len(set(self.expected)), 2)
+
+    def test_lookups_are_served_at_metrics(self):
+        self.cache.predict_many(self.bundle, self.records[:2] * 2)
+        self.client.force_login(create_patient().user)
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('# TYPE predictor_prediction_cache_lookups_total counter', text)
+        self.assertIn('predictor_prediction_cache_lookups_total{result="miss"} 4', text)
+        summary = self.client.get(reverse('metrics'), {'format': 'json'}).json()
+        self.assertEqual(summary['predictor_prediction_cache_lookups_total'],
+                         [{'result': 'hit', 'count': 0}, {'result': 'miss', 'count': 4}])
+
+
+class ScoreCsvTests(TransactionTestCase):
+    """TransactionTestCase because --workers closes every connection before forking."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.patients = [create_patient(0), create_patient(1)]
+        df = pd.read_csv(os.path.join(settings.BASE_DIR, 'static', 'heart.csv')).head(30)
+        df['patient_id'] = [self.patients[0].id, self.patients[1].id, '', 999999] * 7 + [''] * 2
+        self.input = os.path.join(self.tmp, 'cohort.csv')
+        df.to_csv(self.input, index=False)
+
+    def score(self, *args):
+        call_command('score_csv', self.input, '--chunk-size', '7', *args, stdout=open(os.devnull, 'w'))
+
+    def test_workers_give_the_same_rows(self):
+        outputs = []
+        for workers in ('1', '2'):
+            output = os.path.join(self.tmp, f'scored-{workers}.csv')
+            self.score('--output', output, '--workers', workers)
+            outputs.append(pd.read_csv(output))
+        pd.testing.assert_frame_equal(*outputs)
+        self.assertEqual(len(outputs[0]), 30)
+        self.assertEqual(set(outputs[0]['heart_disease_risk']), {'have', "don't have"})
+        bundle = ModelBundle(read_active_version())
+        self.assertEqual(outputs[0]['prediction'].tolist(),
+                         list(score_frame(bundle, pd.read_csv(self.input))))
+
+    def test_save(self):
+        self.score('--save')
+        for patient in self.patients:
+            with self.subTest(patient=patient.id):
+                predictions = Prediction.objects.filter(patient=patient)
+                self.assertEqual(predictions.count(), 7)
+                patient.refresh_from_db()
+                newest = predictions.order_by('-prediction_date', '-id').first()
+                self.assertEqual(patient.latest_prediction_id, newest.id)
+                self.assertEqual(patient.latest_risk, newest.heart_disease_risk)
+        self.assertEqual(Prediction.objects.count(), 14)
+
+
+class SearchResumeTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = tmp.name
+        df = pd.read_csv(os.path.join(settings.BASE_DIR, 'static', 'heart.csv')).head(120)
+        self.X, self.y = df[FEATURE_COLUMNS], df['HeartDisease']
+        self.grid = {'n_estimators': [5], 'max_depth': [2, 3]}
+
+    def search(self, X=None, cv=2, resume=True):
+        with mock.patch('sys.stdout', open(os.devnull, 'w')):
+            return train_model.search(self.X if X is None else X, self.y, self.grid, self.path,
+                                      n_jobs=1, cv=cv, resume=resume)
+
+    def test_resumes_only_the_same_config(self):
+        first = self.search(resume=False)
+        config, results = train_model.load_results(os.path.join(self.path, train_model.RESULTS_FILE))
+        self.assertEqual(config['cv'], 2)
+        self.assertEqual(len(results), 4)
+
+        with mock.patch.object(train_model, 'evaluate') as evaluate:
+            resumed = self.search()
+        evaluate.assert_not_called()
+        self.assertEqual([row['mean_score'] for row in resumed],
+                         [row['mean_score'] for row in first])
+
+        with self.assertRaisesMessage(ValueError, 'run without --resume'):
+            self.search(cv=3)
+        other = self.X.assign(Age=self.X['Age'] + 1)
+        with self.assertRaisesMessage(ValueError, 'run without --resume'):
+            self.search(X=other)
+        self.assertEqual(len(self.search(cv=3, resume=False)), 2)
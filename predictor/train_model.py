@@ -1,66 +1,250 @@
 import pandas as pd
 import joblib
-from sklearn.model_selection import train_test_split, GridSearchCV
-from sklearn.preprocessing import PolynomialFeatures, StandardScaler, LabelEncoder
+from joblib import Memory, Parallel, delayed
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split, ParameterGrid, StratifiedKFold
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import PolynomialFeatures, StandardScaler
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report
+import argparse
+import hashlib
 import os
+import json
+import shutil
+import sys
+import time
+from datetime import datetime
 
-save_path = os.path.join(os.path.dirname(__file__), 'trained_models')
-
-os.makedirs(save_path, exist_ok=True)
-
-df = pd.read_csv(os.path.join(os.path.dirname(__file__), '../static/heart.csv'))
-
-median_cholesterol = df['Cholesterol'].median()
-df['Cholesterol'] = df['Cholesterol'].replace(0, median_cholesterol)
-
-def preprocessing(df, is_training=True, label_encoders=None):
-    categorical_columns = ['Gender', 'ChestPainType', 'RestingECG', 'ExerciseAngina', 'ST_Slope']
-    
-    if is_training:
-        label_encoders = {}
-        for col in categorical_columns:
-            le = LabelEncoder()
-            df[col] = le.fit_transform(df[col])
-            label_encoders[col] = le
-        
-        X = df.drop(columns=['HeartDisease'])
-        y = df['HeartDisease']
-        return X, y, label_encoders
-    else:
-        for col in categorical_columns:
-            if col in label_encoders:
-                df[col] = label_encoders[col].transform(df[col])
-        return df
-
-X, y, label_encoders = preprocessing(df, is_training=True)
-
-poly = PolynomialFeatures(degree=2, interaction_only=True, include_bias=False)
-X_poly = poly.fit_transform(X)
-
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X_poly)
-X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
-
-best_rf = RandomForestClassifier(
-    n_estimators=200, 
-    max_depth=15,   
-    min_samples_split=2,  
-    random_state=42
-)
-best_rf.fit(X_train, y_train)
-y_pred = best_rf.predict(X_test)
-
-accuracy = accuracy_score(y_test, y_pred) * 100
-print(f"Model accuracy after tuning: {accuracy}%")
-print(classification_report(y_test, y_pred))
-
-joblib.dump(best_rf, os.path.join(save_path, 'best_rf_model.pkl'))
-joblib.dump(scaler, os.path.join(save_path, 'scaler.pkl'))
-joblib.dump(poly, os.path.join(save_path, 'poly.pkl'))
-joblib.dump(label_encoders, os.path.join(save_path, 'label_encoders.pkl'))
-
-with open(os.path.join(save_path, 'model_accuracy.txt'), 'w') as f:
-    f.write(str(accuracy))
+try:
+    from .inference import FeatureCompiler, FEATURE_COLUMNS
+    from .forest import FlatForest
+    from .pipeline import HeartFeatureEncoder, ZeroImputer
+except ImportError:
+    # Run as a script. Import through the package anyway so the pickled
+    # pipeline steps refer to predictor.pipeline, where the server loads them from.
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from predictor.inference import FeatureCompiler, FEATURE_COLUMNS
+    from predictor.forest import FlatForest
+    from predictor.pipeline import HeartFeatureEncoder, ZeroImputer
 
+# Usage: python train_model.py [version] [--grid grid.json] [--n-jobs N] [--cv K] [--resume]
+# Searches the RandomForest hyperparameters with cross validation on the
+# training split, then writes the best model as a new bundle to
+# trained_models/versions/<version>; activate it with
+# `manage.py activate_model <version>`.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+VERSIONS_PATH = os.path.join(BASE_DIR, 'trained_models', 'versions')
+DATA_PATH = os.path.join(BASE_DIR, '../static/heart.csv')
+
+# RandomForestClassifier parameters to try; --grid takes a JSON file of the same shape.
+DEFAULT_GRID = {
+    'n_estimators': [100, 200, 400],
+    'max_depth': [None, 10, 15],
+    'min_samples_split': [2, 5],
+}
+
+RESULTS_FILE = 'search_results.jsonl'
+FOLD_SEED = 42
+REPORT_FILE = 'search_report.json'
+
+
+def make_pipeline(memory=None, random_state=42):
+    """encode -> impute -> poly -> scaler -> forest, the steps of pipeline.pkl.
+
+    With ``memory`` the fitted steps before the forest are cached on disk per
+    fold, so candidates that only differ in forest parameters reuse them
+    instead of refitting.
+    """
+    return Pipeline([
+        ('encode', HeartFeatureEncoder()),
+        ('impute', ZeroImputer()),
+        ('poly', PolynomialFeatures(degree=2, interaction_only=True, include_bias=False)),
+        ('scaler', StandardScaler()),
+        ('model', RandomForestClassifier(random_state=random_state)),
+    ], memory=memory)
+
+
+def candidate_key(params):
+    return json.dumps(params, sort_keys=True)
+
+
+def evaluate(pipeline, params, X, y, fold, train, test):
+    start = time.perf_counter()
+    estimator = clone(pipeline).set_params(**{f'model__{k}': v for k, v in params.items()})
+    estimator.fit(X.iloc[train], y.iloc[train])
+    fit_time = time.perf_counter() - start
+    score = accuracy_score(y.iloc[test], estimator.predict(X.iloc[test]))
+    return {'params': params, 'fold': fold, 'score': score, 'fit_time': fit_time,
+            'score_time': time.perf_counter() - start - fit_time}
+
+
+def search_config(X, y, cv):
+    """What the folds of a search depend on; a search only resumes one with the same config."""
+    data = pd.util.hash_pandas_object(pd.concat([X, y], axis=1), index=True).to_numpy()
+    return {'cv': cv, 'fold_seed': FOLD_SEED, 'rows': len(X),
+            'data_sha256': hashlib.sha256(data.tobytes()).hexdigest()}
+
+
+def load_results(path):
+    """The config and finished (candidate, fold) evaluations of an earlier run of the search."""
+    config, results = None, []
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:  # the interrupted run's last, partial line
+                    break
+                if 'config' in record:
+                    config = record['config']
+                else:
+                    results.append(record)
+    return config, results
+
+
+def search(X, y, grid, save_path, n_jobs=-1, cv=5, cache_dir=None, resume=False):
+    """Cross validate every candidate in ``grid`` and return the per-candidate summary.
+
+    Every (candidate, fold) fit is a separate task for the joblib process
+    pool and is appended to search_results.jsonl as soon as it finishes, so
+    ``resume`` only runs the ones an interrupted search didn't get to. The
+    file starts with the search's config (folds and data), and resuming a
+    search with another config raises ValueError instead of ranking scores
+    from different folds together.
+    """
+    results_path = os.path.join(save_path, RESULTS_FILE)
+    config = search_config(X, y, cv)
+    results = []
+    if resume:
+        previous, results = load_results(results_path)
+        if results and previous != config:
+            raise ValueError(f"{results_path} is from a search with {previous}, not {config}; "
+                             f"run without --resume to start over.")
+    done = {(candidate_key(r['params']), r['fold']) for r in results}
+
+    candidates = list(ParameterGrid(grid))
+    folds = list(StratifiedKFold(n_splits=cv, shuffle=True, random_state=FOLD_SEED).split(X, y))
+    pipeline = make_pipeline(Memory(cache_dir, verbose=0) if cache_dir else None)
+    pending = [(params, fold) for params in candidates for fold in range(cv)
+               if (candidate_key(params), fold) not in done]
+    print(f"{len(candidates)} candidates x {cv} folds: {len(done)} fits already done, "
+          f"{len(pending)} to run on {n_jobs} jobs")
+
+    with open(results_path, 'w') as f:
+        # Rewritten rather than appended to, which drops a partial last line.
+        f.write(json.dumps({'config': config}) + '\n')
+        for result in results:
+            f.write(json.dumps(result) + '\n')
+        tasks = (delayed(evaluate)(pipeline, params, X, y, fold, *folds[fold])
+                 for params, fold in pending)
+        for result in Parallel(n_jobs=n_jobs, return_as='generator_unordered')(tasks):
+            f.write(json.dumps(result) + '\n')
+            f.flush()
+            results.append(result)
+
+    summary = []
+    for params in candidates:
+        runs = [r for r in results if candidate_key(r['params']) == candidate_key(params)]
+        scores = pd.Series([r['score'] for r in runs])
+        summary.append({
+            'params': params,
+            'mean_score': float(scores.mean()),
+            'std_score': float(scores.std(ddof=0)),
+            'mean_fit_time': sum(r['fit_time'] for r in runs) / len(runs),
+            'mean_score_time': sum(r['score_time'] for r in runs) / len(runs),
+        })
+    summary.sort(key=lambda row: row['mean_score'], reverse=True)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train and save a new model version.")
+    parser.add_argument('version', nargs='?',
+                        default=datetime.now().strftime('rf-%Y%m%d%H%M%S'))
+    parser.add_argument('--grid', help="JSON file of RandomForestClassifier parameter lists.")
+    parser.add_argument('--n-jobs', type=int, default=-1,
+                        help="Worker processes for the search (default: all cores).")
+    parser.add_argument('--cv', type=int, default=5, help="Cross validation folds (default 5).")
+    parser.add_argument('--cache-dir',
+                        help="Where fitted poly/scaler steps are cached "
+                             "(default: <version>/.cache, removed afterwards).")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue an interrupted search of the same version "
+                             "(same --cv and data).")
+    args = parser.parse_args(argv)
+
+    save_path = os.path.join(VERSIONS_PATH, args.version)
+    os.makedirs(save_path, exist_ok=True)
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid, 'r') as f:
+            grid = json.load(f)
+    cache_dir = args.cache_dir or os.path.join(save_path, '.cache')
+
+    df = pd.read_csv(DATA_PATH)
+    X, y = df[FEATURE_COLUMNS], df['HeartDisease']
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    start = time.perf_counter()
+    summary = search(X_train, y_train, grid, save_path, n_jobs=args.n_jobs, cv=args.cv,
+                     cache_dir=cache_dir, resume=args.resume)
+    search_time = time.perf_counter() - start
+    best_params = summary[0]['params']
+
+    start = time.perf_counter()
+    best = make_pipeline().set_params(**{f'model__{k}': v for k, v in best_params.items()})
+    best.fit(X_train, y_train)
+    refit_time = time.perf_counter() - start
+    encoder, imputer, poly, scaler, best_rf = (
+        best.named_steps[name] for name in ('encode', 'impute', 'poly', 'scaler', 'model'))
+    y_pred = best.predict(X_test)
+
+    accuracy = accuracy_score(y_test, y_pred) * 100
+    print(f"Best parameters: {best_params} (cv accuracy {summary[0]['mean_score'] * 100:.2f}%)")
+    print(f"Model accuracy after tuning: {accuracy}%")
+    print(classification_report(y_test, y_pred))
+
+    joblib.dump(best, os.path.join(save_path, 'pipeline.pkl'))
+    FeatureCompiler.from_transformers(poly, scaler).save(os.path.join(save_path, 'feature_compiler.npz'))
+    FlatForest.from_sklearn(best_rf).save(os.path.join(save_path, 'forest'))
+
+    with open(os.path.join(save_path, 'model_accuracy.txt'), 'w') as f:
+        f.write(str(accuracy))
+
+    schema = {
+        'version': args.version,
+        'model': type(best_rf).__name__,
+        'params': best_params,
+        'trained_at': datetime.now().isoformat(timespec='seconds'),
+        'features': FEATURE_COLUMNS,
+        'categories': {col: [str(c) for c in classes] for col, classes in encoder.classes_.items()},
+        # Medians of the training split that replace unmeasured (zero) values.
+        'imputation': imputer.fill_values_,
+        'n_model_features': int(poly.n_output_features_),
+    }
+    with open(os.path.join(save_path, 'schema.json'), 'w') as f:
+        json.dump(schema, f, indent=4)
+
+    report = {
+        'n_jobs': args.n_jobs,
+        'cv': args.cv,
+        'search_seconds': search_time,
+        'refit_seconds': refit_time,
+        'test_accuracy': accuracy,
+        'candidates': summary,
+    }
+    with open(os.path.join(save_path, REPORT_FILE), 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Search took {search_time:.1f}s, refit {refit_time:.1f}s")
+    for row in summary:
+        print(f"  {row['mean_score'] * 100:6.2f}% +- {row['std_score'] * 100:4.2f}  "
+              f"fit {row['mean_fit_time']:.2f}s  {row['params']}")
+
+    if not args.cache_dir:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    print(f"Saved model version '{args.version}' to {save_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -8,8 +9,18 @@ urlpatterns = [
     path('register/doctor/', views.register_doctor, name='register_doctor'),
     path('register/patient/', views.register_patient, name='register_patient'),
     path('profile/', views.profile, name='profile'),
-    path('heart/', views.heart, name='heart'),
+    path('heart/', views.heart_async if getattr(settings, 'PREDICTOR_ASYNC_HEART', False) else views.heart,
+         name='heart'),
+    path('heart/async/', views.heart_async, name='heart_async'),
+    path('api/predict/batch/', views.predict_batch, name='predict_batch'),
+    path('api/patients/', views.doctor_patients_api, name='doctor_patients_api'),
+    path('api/patients/<int:id>/predictions/', views.patient_predictions_api,
+         name='patient_predictions_api'),
     path('doctor/patients/', views.doctor_patients, name='doctor_patients'),
+    path('doctor/dashboard/', views.doctor_dashboard_view, name='doctor_dashboard'),
+    path('api/doctor/dashboard/', views.doctor_dashboard_api, name='doctor_dashboard_api'),
+    path('api/stats/', views.stats_report_api, name='stats_report_api'),
+    path('metrics', views.metrics_endpoint, name='metrics'),
     path('patient/<int:id>/', views.patient_detail, name='patient_detail'),
     path('patient/<int:patient_id>/add_recommendation/', 
          views.add_recommendation_to_patient, name='add_recommendation'),
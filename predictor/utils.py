@@ -1,80 +1,78 @@
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.model_selection import train_test_split, GridSearchCV
-from imblearn.over_sampling import SMOTE
-import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score, classification_report
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from .models import Patient, Prediction
+from .dashboard import invalidate_for_predictions
+from .recommendations import recommendations_for
 
 
+def risk_label(prediction):
+    return 'have' if prediction == 1 else "don't have"
 
-def preprocessing(df, is_training=True, label_encoders=None):
-    categorical_columns = {
-        'Gender': ['M', 'F'],
-        'ChestPainType': ['TA', 'ATA', 'NAP', 'ASY'],
-        'RestingECG': ['Normal', 'ST', 'LVH'],
-        'ExerciseAngina': ['Y', 'N'],
-        'ST_Slope': ['Up', 'Flat', 'Down']
-    }
-    
-    if 'Cholesterol' in df.columns:
-        df['Cholesterol'] = df['Cholesterol'].replace(0, df['Cholesterol'].median())
-    
-    if is_training:
-        label_encoders = {}
-        for col, categories in categorical_columns.items():
-            if col not in df.columns:
-                raise ValueError(f"Column '{col}' is missing from the DataFrame.")
-            
-            le = LabelEncoder()
-            le.fit(categories)  
-            df[col] = le.transform(df[col])
-            label_encoders[col] = le
-        
-        if 'HeartDisease' in df.columns:
-            X = df.drop(columns=['HeartDisease'])
-            y = df['HeartDisease'].apply(lambda x: 1 if x == "have" else 0)  
-        else:
-            raise ValueError("The 'HeartDisease' column is missing from the training data.")
-        
-        return X, y, label_encoders
-    
-    else:
-        for col in categorical_columns:
-            if col in label_encoders:
-                if col not in df.columns:
-                    raise ValueError(f"Column '{col}' is missing from the DataFrame.")
-                df[col] = label_encoders[col].transform(df[col])
-        
-        return df
-        
-
-def get_recommendations(latest_prediction):
-    recommendations = []
-    
-    if latest_prediction.heart_disease_risk == 'have':
-        if latest_prediction.cholesterol > 200:
-            recommendations.append("Heart-healthy diet and regular moderate-intensity exercise" 
-                                   "recommended.")
-        if latest_prediction.restingbp > 130:
-            recommendations.append("Regularly monitor your blood pressure and adopt lifestyle" 
-                                   "changes.")
-        if latest_prediction.fastingbs == 1:
-            recommendations.append("Balanced diet, regular exercise and further medical evaluation" 
-                                   "for diabetes recommended.")
-        if latest_prediction.exerciseangina == 'Y':
-            recommendations.append("Avoid strenuous activities until further evaluation is completed.")
-        if latest_prediction.chest_pain_type != 'ASY' or latest_prediction.restingecg != 'Normal' or \
-           latest_prediction.oldpeak > 1 or latest_prediction.st_slope != 'Flat':
-            recommendations.append("Further medical evaluation needed.")
-    else:
-        recommendations.append("The patient is okay with no significant risks detected.")
-
-    return recommendations
 
+def build_prediction(patient, cleaned_data, prediction, model_version=''):
+    """Unsaved Prediction for a HeartDiseaseForm submission and its model output."""
+    return Prediction(
+        patient=patient,
+        age=cleaned_data['age'],
+        gender=cleaned_data['gender'],
+        chest_pain_type=cleaned_data['cp'],
+        restingbp=cleaned_data['trestbps'],
+        cholesterol=cleaned_data['chol'],
+        fastingbs=cleaned_data['fbs'],
+        restingecg=cleaned_data['restecg'],
+        maxhr=cleaned_data['maxhr'],
+        exerciseangina=cleaned_data['exang'],
+        oldpeak=cleaned_data['oldpeak'],
+        st_slope=cleaned_data['slope'],
+        heart_disease_risk=risk_label(prediction),
+        model_version=model_version,
+    )
 
 
+def save_predictions(predictions):
+    """Insert predictions and move each patient's latest-prediction snapshot forward.
 
+    Both happen in one transaction. A single prediction only replaces a
+    snapshot that is older than itself, so concurrent submissions can't leave
+    an older one behind; a bulk insert recomputes the affected patients'
+    snapshots with one UPDATE.
+    """
+    if not predictions:
+        return predictions
+    with transaction.atomic():
+        if len(predictions) == 1:
+            prediction = predictions[0]
+            prediction.save()
+            Patient.objects.filter(
+                Q(latest_prediction_date__isnull=True) |
+                Q(latest_prediction_date__lte=prediction.prediction_date),
+                pk=prediction.patient_id,
+            ).update(latest_prediction=prediction, latest_risk=prediction.heart_disease_risk,
+                     latest_prediction_date=prediction.prediction_date)
+        else:
+            predictions = Prediction.objects.bulk_create(predictions, batch_size=1000)
+            patient_ids = sorted({prediction.patient_id for prediction in predictions})
+            for i in range(0, len(patient_ids), 500):
+                refresh_latest_predictions(Patient.objects.filter(pk__in=patient_ids[i:i + 500]))
+        invalidate_for_predictions(predictions)
+    return predictions
 
 
+def refresh_latest_predictions(patients=None):
+    """Recompute the latest-prediction snapshot of ``patients`` (default: all) in one UPDATE."""
+    if patients is None:
+        patients = Patient.objects.all()
+    latest = (Prediction.objects.filter(patient=OuterRef('pk'))
+              .order_by('-prediction_date', '-id'))
+    return patients.update(
+        latest_prediction=Subquery(latest.values('id')[:1]),
+        latest_risk=Coalesce(Subquery(latest.values('heart_disease_risk')[:1]), Value('')),
+        latest_prediction_date=Subquery(latest.values('prediction_date')[:1]),
+    )
 
 
+def get_recommendations(latest_prediction):
+    # The rules live in recommendations.RULES; use recommendations_for_columns
+    # or recommendations_for_queryset to evaluate them over many predictions.
+    return recommendations_for(latest_prediction)
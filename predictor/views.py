@@ -4,16 +4,81 @@ from django.contrib.auth.decorators import login_required
 from .forms import HeartDiseaseForm, PatientRegistrationForm, DoctorRegistrationForm, SelectDoctorForm, RecommendationForm, EmailLoginForm
 from .models import Doctor, Patient, Recommendation, Prediction
 from django.contrib.auth import get_user_model
-import pandas as pd
-from django.utils import timezone
-from django.http import HttpResponse, HttpResponseForbidden
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.views.decorators.http import require_POST
+from django.conf import settings
 from .utils import *
-import joblib
-import os
+from .model_registry import registry
+from .prediction_cache import prediction_cache
+from .scoring import score_records
+from .pagination import InvalidCursor, KeysetPage, cursor_for, keyset_paginate
+from .batching import MicroBatcher, WriteBehindBatcher
+from .jobs import enqueue
+from .dashboard import doctor_dashboard, invalidate_dashboards
+from . import fragments, metrics, stats
+from django.contrib.admin.views.decorators import staff_member_required
+from .async_inference import PoolSaturated, get_inference_pool
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+import atexit
+import datetime
+import json
 
 
 CustomUser = get_user_model()
 
+PREDICTION_ORDERING = ('-prediction_date', '-id')
+# Patients page by id, the order they registered in: the doctor_id index is
+# (doctor_id, id) underneath, so a page is an index seek, where ordering on
+# the joined user's name sorted the doctor's whole patient list every time.
+PATIENT_ORDERING = ('id',)
+PREDICTIONS_PAGE_SIZE = getattr(settings, 'PREDICTIONS_PAGE_SIZE', 20)
+PATIENTS_PAGE_SIZE = getattr(settings, 'PATIENTS_PAGE_SIZE', 50)
+BATCH_MAX_RECORDS = getattr(settings, 'PREDICTOR_BATCH_MAX_RECORDS', 500)
+
+
+def prediction_history(patient, cursor=None, page_size=None):
+    """The latest prediction and a keyset page of older ones.
+
+    The latest prediction comes from the patient's snapshot (select_related
+    'latest_prediction' to avoid a query). Without a cursor the page starts
+    right after it.
+    """
+    predictions = Prediction.objects.filter(patient=patient)
+    latest = patient.latest_prediction
+    if latest is None:
+        return None, KeysetPage([], None)
+    page = keyset_paginate(predictions, PREDICTION_ORDERING,
+                           cursor or cursor_for(latest, PREDICTION_ORDERING),
+                           page_size or PREDICTIONS_PAGE_SIZE)
+    return latest, page
+
+
+def can_view_patient(user, patient):
+    if user.user_type == 'doctor':
+        return patient.doctor is not None and patient.doctor.user_id == user.id
+    return user.user_type == 'patient' and patient.user_id == user.id
+
+
+def prediction_as_dict(prediction):
+    return {
+        'id': prediction.id,
+        'prediction_date': prediction.prediction_date.isoformat(),
+        'heart_disease_risk': prediction.heart_disease_risk,
+        'model_version': prediction.model_version,
+        'age': prediction.age,
+        'gender': prediction.gender,
+        'chest_pain_type': prediction.chest_pain_type,
+        'restingbp': prediction.restingbp,
+        'cholesterol': prediction.cholesterol,
+        'fastingbs': prediction.fastingbs,
+        'restingecg': prediction.restingecg,
+        'maxhr': prediction.maxhr,
+        'exerciseangina': prediction.exerciseangina,
+        'oldpeak': prediction.oldpeak,
+        'st_slope': prediction.st_slope,
+    }
+
 def register_doctor(request):
     if request.method == 'POST':
         form = DoctorRegistrationForm(request.POST)
@@ -55,7 +120,7 @@ def profile(request):
 
     if user.user_type == 'doctor':
         try:
-            profile = Doctor.objects.get(user=user)
+            profile = Doctor.objects.select_related('user').get(user=user)
             context['profile'] = profile
             context['doctor_id'] = profile.doctor_id
         except Doctor.DoesNotExist:
@@ -63,21 +128,27 @@ def profile(request):
 
     elif user.user_type == 'patient':
         try:
-            profile = Patient.objects.get(user=user)
+            profile = Patient.objects.select_related('user', 'latest_prediction').get(user=user)
             context['profile'] = profile
-            predictions = Prediction.objects.filter(patient=profile).order_by('-prediction_date')
-            if predictions.exists():
-                latest_prediction = predictions.first()
-                context['latest_prediction'] = latest_prediction
-                context['predictions'] = predictions
-
-            recommendations = Recommendation.objects.filter(patient=profile)
+            try:
+                latest_prediction, history = prediction_history(profile, request.GET.get('cursor'))
+            except InvalidCursor:
+                latest_prediction, history = prediction_history(profile)
+            fragments.attach(history, fragments.PROFILE_PREDICTION)
+            context['latest_prediction'] = latest_prediction
+            context['history'] = history
+
+            recommendations = fragments.attach(Recommendation.objects.filter(patient=profile)
+                                               .select_related('doctor__user'),
+                                               fragments.RECOMMENDATION)
             context['recommendations'] = recommendations
 
             if request.method == 'POST':
+                previous_doctor_id = profile.doctor_id
                 form = SelectDoctorForm(request.POST, instance=profile)
                 if form.is_valid():
                     form.save()
+                    invalidate_dashboards([previous_doctor_id, profile.doctor_id])
                     return redirect('profile')
             else:
                 form = SelectDoctorForm(instance=profile)
@@ -98,15 +169,33 @@ def logout(request):
     auth_logout(request)
     return redirect('login')
 
-models_path = os.path.join(os.path.dirname(__file__), 'trained_models')
+DEFERRED_SAVE = getattr(settings, 'PREDICTOR_DEFERRED_SAVE', False)
+write_behind = getattr(settings, 'PREDICTOR_WRITE_BEHIND', None)
+prediction_writer = WriteBehindBatcher(save_predictions, **write_behind) if write_behind else None
+if prediction_writer is not None:
+    atexit.register(prediction_writer.flush, 10)
+
 
-model = joblib.load(os.path.join(models_path, 'best_rf_model.pkl'))
-scaler = joblib.load(os.path.join(models_path, 'scaler.pkl'))
-poly = joblib.load(os.path.join(models_path, 'poly.pkl'))
-label_encoders = joblib.load(os.path.join(models_path, 'label_encoders.pkl'))
+def persist_prediction(patient, cleaned_data, prediction, model_version):
+    """Save a heart() result, or hand it to the job queue when DEFERRED_SAVE is on
+    or to the write-behind batcher when PREDICTOR_WRITE_BEHIND is set.
 
-with open(os.path.join(models_path, 'model_accuracy.txt'), 'r') as f:
-    accuracy = float(f.read().strip())
+    Returns True when the save was deferred.
+    """
+    if DEFERRED_SAVE:
+        enqueue('save_prediction', patient_id=patient.id, data=cleaned_data,
+                prediction=int(prediction), model_version=model_version)
+        return True
+    prediction = build_prediction(patient, cleaned_data, prediction, model_version=model_version)
+    if prediction_writer is not None:
+        prediction_writer.submit(prediction)
+        return True
+    save_predictions([prediction])
+    return False
+
+
+micro_batch = getattr(settings, 'PREDICTOR_MICRO_BATCH', None)
+batcher = MicroBatcher(score_records, **micro_batch) if micro_batch else None
 
 
 @login_required
@@ -119,58 +208,196 @@ def heart(request):
 
     if request.method == 'POST':
         form = HeartDiseaseForm(request.POST)
-        if form.is_valid():
-            user_data = {
-                'Age': form.cleaned_data['age'],
-                'Gender': form.cleaned_data['gender'],
-                'ChestPainType': form.cleaned_data['cp'],
-                'RestingBP': form.cleaned_data['trestbps'],
-                'Cholesterol': form.cleaned_data['chol'],
-                'FastingBS': form.cleaned_data['fbs'],
-                'RestingECG': form.cleaned_data['restecg'],
-                'MaxHR': form.cleaned_data['maxhr'],
-                'ExerciseAngina': form.cleaned_data['exang'],
-                'Oldpeak': form.cleaned_data['oldpeak'],
-                'ST_Slope': form.cleaned_data['slope']
-            }
-            user_data_df = pd.DataFrame([user_data])
-
-            # Preprocess the user data
-            user_data_encoded = preprocessing(user_data_df, is_training=False, 
-                                              label_encoders=label_encoders)
-            user_data_poly = poly.transform(user_data_encoded)
-            user_data_scaled = scaler.transform(user_data_poly)
-
+        with metrics.stage('validate'):
+            valid = form.is_valid()
+        if valid:
             # Make prediction
-            prediction = model.predict(user_data_scaled)[0]
-            result = 'have' if prediction == 1 else "don't have"
-
-            Prediction.objects.create(
-                patient=patient_profile,
-                age=form.cleaned_data['age'],
-                gender=form.cleaned_data['gender'],
-                chest_pain_type=form.cleaned_data['cp'],
-                restingbp=form.cleaned_data['trestbps'],
-                cholesterol=form.cleaned_data['chol'],
-                fastingbs=form.cleaned_data['fbs'],
-                restingecg=form.cleaned_data['restecg'],
-                maxhr=form.cleaned_data['maxhr'],
-                exerciseangina=form.cleaned_data['exang'],
-                oldpeak=form.cleaned_data['oldpeak'],
-                st_slope=form.cleaned_data['slope'],
-                heart_disease_risk=result,
-                prediction_date=timezone.now().date()
-            )
-            return redirect('profile')
+            with metrics.stage('predict'):
+                if batcher is not None:
+                    prediction, model_version = batcher.predict(form.cleaned_data)
+                else:
+                    bundle = registry.current()
+                    prediction = prediction_cache.predict(bundle, form.cleaned_data)
+                    model_version = bundle.version
+
+            with metrics.stage('save'):
+                deferred = persist_prediction(patient_profile, form.cleaned_data, prediction,
+                                              model_version)
+            if not deferred:
+                return redirect('profile')
+            return render(request, 'heart.html', {
+                'form': HeartDiseaseForm(),
+                'accuracy': registry.accuracy,
+                'result': risk_label(prediction),
+            })
 
     else:
         form = HeartDiseaseForm()
 
     return render(request, 'heart.html', {
         'form': form,
-        'accuracy': accuracy,  
+        'accuracy': registry.accuracy,  
     })
 
+async def heart_async(request):
+    """heart() for ASGI deployments.
+
+    The event loop only validates the form; scoring runs on the bounded
+    inference pool and saving and rendering on Django's sync thread. When the
+    pool is full the request is turned away with 503 instead of queueing.
+    login_required doesn't wrap async views in Django 5.0, so the user is
+    checked here.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    request.user = user
+    try:
+        patient_profile = await Patient.objects.aget(user=user)
+    except Patient.DoesNotExist:
+        return HttpResponse("Patient profile not found.", status=404)
+
+    if request.method == 'POST':
+        form = HeartDiseaseForm(request.POST)
+        with metrics.stage('validate'):
+            valid = form.is_valid()
+        if valid:
+            try:
+                with metrics.stage('predict'):
+                    [(prediction, model_version)] = await get_inference_pool().run(
+                        score_records, [form.cleaned_data])
+            except PoolSaturated:
+                response = HttpResponse("Too many predictions in progress, try again shortly.",
+                                        status=503)
+                response['Retry-After'] = '1'
+                return response
+            with metrics.stage('save'):
+                deferred = await sync_to_async(persist_prediction)(
+                    patient_profile, form.cleaned_data, prediction, model_version)
+            if not deferred:
+                return redirect('profile')
+            context = {'form': HeartDiseaseForm(), 'result': risk_label(prediction)}
+        else:
+            context = {'form': form}
+    else:
+        context = {'form': HeartDiseaseForm()}
+
+    context['accuracy'] = await sync_to_async(lambda: registry.accuracy)()
+    return await sync_to_async(render)(request, 'heart.html', context)
+
+def batch_patient_id(record):
+    """The record's patient_id as an int (JSON clients often send "12"), or None."""
+    value = record.get('patient_id') if isinstance(record, dict) else None
+    if value is None:
+        return None
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+        return value
+    raise ValueError('Enter a whole number.')
+
+
+@login_required
+@require_POST
+def predict_batch(request):
+    """Score a list of patient records in one model call.
+
+    Expects ``{"records": [{<HeartDiseaseForm fields>, "patient_id": ...}, ...]}``.
+    Patients' records are saved to their own profile; doctors' records are
+    saved for the referenced patient when it is one of theirs, and only scored
+    otherwise. Lists longer than PREDICTOR_BATCH_MAX_RECORDS are refused with 413.
+    """
+    try:
+        records = json.loads(request.body)['records']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON object with a "records" list.'}, status=400)
+    if not isinstance(records, list):
+        return JsonResponse({'error': '"records" must be a list.'}, status=400)
+    if len(records) > BATCH_MAX_RECORDS:
+        return JsonResponse({'error': f'At most {BATCH_MAX_RECORDS} records per request.'},
+                            status=413)
+
+    forms, patient_ids, errors = [], [], {}
+    for i, record in enumerate(records):
+        form = HeartDiseaseForm(record if isinstance(record, dict) else {})
+        if form.is_valid():
+            forms.append(form)
+        else:
+            errors[i] = form.errors
+        try:
+            patient_ids.append(batch_patient_id(record))
+        except ValueError as exc:
+            errors.setdefault(i, {})['patient_id'] = [str(exc)]
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+
+    user = request.user
+    if user.user_type == 'patient':
+        own = get_object_or_404(Patient, user=user)
+        owners = [own] * len(records)
+    elif user.user_type == 'doctor':
+        patients = Patient.objects.filter(doctor__user=user).in_bulk(
+            {pk for pk in patient_ids if pk is not None})
+        owners = [patients.get(pk) for pk in patient_ids]
+    else:
+        owners = [None] * len(records)
+
+    cleaned = [form.cleaned_data for form in forms]
+    bundle = registry.current()
+    predictions = prediction_cache.predict_many(bundle, cleaned)
+
+    save_predictions([
+        build_prediction(patient, data, prediction, model_version=bundle.version)
+        for patient, data, prediction in zip(owners, cleaned, predictions)
+        if patient is not None
+    ])
+
+    return JsonResponse({'results': [
+        {
+            'patient_id': patient.id if patient is not None else None,
+            'prediction': prediction,
+            'heart_disease_risk': risk_label(prediction),
+            'saved': patient is not None,
+        }
+        for patient, prediction in zip(owners, predictions)
+    ], 'model_version': bundle.version})
+
+
+@login_required
+def patient_predictions_api(request, id):
+    """Prediction history of a patient, newest first, one keyset page at a time."""
+    patient = get_object_or_404(Patient.objects.select_related('doctor'), id=id)
+    if not can_view_patient(request.user, patient):
+        return JsonResponse({'error': 'Forbidden.'}, status=403)
+    predictions = Prediction.objects.filter(patient=patient)
+    try:
+        page = keyset_paginate(predictions, PREDICTION_ORDERING, request.GET.get('cursor'),
+                               PREDICTIONS_PAGE_SIZE)
+    except InvalidCursor as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse({
+        'results': [prediction_as_dict(p) for p in page],
+        'next_cursor': page.next_cursor,
+    })
+
+
+@login_required
+def doctor_patients_api(request):
+    if request.user.user_type != 'doctor':
+        return JsonResponse({'error': 'Forbidden.'}, status=403)
+    patients = Patient.objects.filter(doctor__user=request.user).select_related('user')
+    try:
+        page = keyset_paginate(patients, PATIENT_ORDERING, request.GET.get('cursor'),
+                               PATIENTS_PAGE_SIZE)
+    except InvalidCursor as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse({
+        'results': [{'id': p.id, 'first_name': p.user.first_name, 'last_name': p.user.last_name}
+                    for p in page],
+        'next_cursor': page.next_cursor,
+    })
+
+
 def home(request):
     return render(request, 'home.html')
 
@@ -180,21 +407,79 @@ def doctor_patients(request):
     if request.user.user_type != 'doctor':
         return redirect('profile')  
     doctor = get_object_or_404(Doctor, user=request.user)
-    patients = Patient.objects.filter(doctor=doctor)
+    patients = Patient.objects.filter(doctor=doctor).select_related('user')
+    try:
+        page = keyset_paginate(patients, PATIENT_ORDERING, request.GET.get('cursor'),
+                               PATIENTS_PAGE_SIZE)
+    except InvalidCursor:
+        page = keyset_paginate(patients, PATIENT_ORDERING, None, PATIENTS_PAGE_SIZE)
 
-    return render(request, 'doctor_patients.html', {'patients': patients})
+    return render(request, 'doctor_patients.html', {'patients': page})
 
 
 
+@login_required
+def doctor_dashboard_view(request):
+    if request.user.user_type != 'doctor':
+        return redirect('profile')
+    doctor = get_object_or_404(Doctor, user=request.user)
+    return render(request, 'doctor_dashboard.html', {'dashboard': doctor_dashboard(doctor)})
+
+
+@login_required
+def doctor_dashboard_api(request):
+    if request.user.user_type != 'doctor':
+        return JsonResponse({'error': 'Only doctors have a dashboard.'}, status=403)
+    doctor = get_object_or_404(Doctor, user=request.user)
+    return JsonResponse(doctor_dashboard(doctor))
+
+
+STATS_GROUPS = ('date', 'gender', 'age_band', 'chest_pain_type')
+
+
+@staff_member_required
+def stats_report_api(request):
+    """Population report from the daily rollup: ``?by=gender,age_band&start=&end=`` (ISO dates)."""
+    by = [field for field in request.GET.get('by', 'gender').split(',') if field]
+    if not by or any(field not in STATS_GROUPS for field in by):
+        return JsonResponse({'error': f'"by" must be a comma separated list of {", ".join(STATS_GROUPS)}.'},
+                            status=400)
+    try:
+        start, end = (datetime.date.fromisoformat(request.GET[name]) if request.GET.get(name) else None
+                      for name in ('start', 'end'))
+    except ValueError:
+        return JsonResponse({'error': 'Dates must be YYYY-MM-DD.'}, status=400)
+    rows = stats.report(by, start, end)
+    for row in rows:
+        if 'date' in row:
+            row['date'] = row['date'].isoformat()
+    return JsonResponse({'results': rows})
+
+
+def metrics_endpoint(request):
+    """Prometheus scrape target for this process's metrics (``?format=json`` for p50/p95/p99).
+
+    Open to INTERNAL_IPS, which is where the scraper runs, and to staff users.
+    """
+    if not metrics.enabled:
+        raise Http404
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS and not request.user.is_staff:
+        return HttpResponseForbidden()
+    if request.GET.get('format') == 'json':
+        return JsonResponse(metrics.summary())
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @login_required
 def add_recommendation_to_patient(request, patient_id):
-    patient = get_object_or_404(Patient, id=patient_id)
-    latest_prediction = Prediction.objects.filter(patient=patient).order_by('-prediction_date').first()
+    patient = get_object_or_404(Patient.objects.select_related('latest_prediction'), id=patient_id)
+    latest_prediction = patient.latest_prediction
     
     if not latest_prediction:
         return redirect('patient_detail', id=patient.id) 
 
-    recommendations = get_recommendations(latest_prediction)
+    recommendations = (latest_prediction.suggested_recommendations or
+                       get_recommendations(latest_prediction))
 
     if request.user.user_type != 'doctor':
         return redirect('profile')  
@@ -226,16 +511,24 @@ def add_recommendation_to_patient(request, patient_id):
 
 @login_required
 def patient_detail(request, id):
-    patient = get_object_or_404(Patient, id=id)
-    
-    if (request.user.user_type == 'doctor' and patient.doctor == request.user.doctor) or (request.user.user_type == 'patient' and patient.user == request.user):
-        recommendations = Recommendation.objects.filter(patient=patient).order_by('-created_at')  
-        predictions = Prediction.objects.filter(patient=patient).order_by('-prediction_date')  
-        
+    patient = get_object_or_404(
+        Patient.objects.select_related('user', 'doctor', 'latest_prediction'), id=id)
+
+    if can_view_patient(request.user, patient):
+        recommendations = fragments.attach(Recommendation.objects.filter(patient=patient)
+                                           .select_related('doctor__user').order_by('-created_at'),
+                                           fragments.RECOMMENDATION)
+        try:
+            latest_prediction, history = prediction_history(patient, request.GET.get('cursor'))
+        except InvalidCursor:
+            latest_prediction, history = prediction_history(patient)
+        fragments.attach(history)
+
         return render(request, 'patient_detail.html', {
             'profile': patient,
             'recommendations': recommendations,
-            'predictions': predictions
+            'latest_prediction': latest_prediction,
+            'history': history,
         })
     return redirect('profile')
 